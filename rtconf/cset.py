@@ -6,6 +6,8 @@ from __future__ import annotations
 
 import typing as typ
 
+import functools
+
 from . import tools as tl
 
 import subprocess as sproc
@@ -41,17 +43,26 @@ class CPUSpec:
 
         self.cpu_list = cpu_list
         self.cpu_list.sort()
+        self.cpu_set = frozenset(self.cpu_list)  # O(1) membership tests
         self.mask = tl.list_to_mask(self.cpu_list)
 
         self.mem_list = mem_list
 
+        # cset / cpulist string forms, computed once
+        self._range_notation = tl.sorted_list_to_range_notation(self.cpu_list)
+        self._mem_range_notation = (tl.list_to_range_notation(self.mem_list)
+                                    if self.mem_list else '')
+
         self.no_irqbalance = no_irqbalance  # Use to flag disabling from irqbalance.
 
     def __repr__(self) -> str:
-        return f'({self.name}, {tl.list_to_range_notation(self.cpu_list)})'
+        return f'({self.name}, {self._range_notation})'
 
     def get_str(self) -> str:
-        return tl.list_to_range_notation(self.cpu_list)
+        return self._range_notation
+
+    def get_mem_str(self) -> str:
+        return self._mem_range_notation
 
     @tl.root_decorator
     def create(self) -> None:
@@ -59,9 +70,17 @@ class CPUSpec:
         logg.info(f'CPUSpec::create ({self.name}, {cpu_str})')
         cmd = f'cset set --cpu {cpu_str}'
         if self.mem_list is not None:
-            cmd += f' -m {tl.list_to_range_notation(self.mem_list)}'
+            cmd += f' -m {self.get_mem_str()}'
         cmd += f' --set {self.name}'
 
         r = sproc.run(cmd.split(' ')).returncode
         if r != 0:
             logg.error(f'CPUSpec::create failed - cset return {r}')
+
+
+@functools.lru_cache(maxsize=4096)
+def cached_cpuspec(name: str, cpus: frozenset[int]) -> CPUSpec:
+    '''
+    Memoized CPUSpec factory - the returned instances are shared, treat as read-only.
+    '''
+    return CPUSpec(name, cpu_list=list(cpus))
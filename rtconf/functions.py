@@ -3,30 +3,38 @@
 '''
 from __future__ import annotations
 
-import typing as typ
-
 import os
-import glob
 import time
-import re
+import errno
+import functools
 
 import subprocess as sproc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from . import tools as tl
-from .irqs import IRQ, IRQ_TYPE
+from .irqs import IRQ, IRQ_TYPE, IRQTable
 from .pcidevices import PCIDevice
-from .cset import CPUSpec
+from .cset import CPUSpec, cached_cpuspec
 from .kthread import KThread, KThreadTypeEnum
 from .meta_obj import EDTObject  # FIXME rename this is really just a PCI + KT + IRQ struct
 
 import numpy as np
 
-from sortedcontainers import SortedDict
-
 import logging
 
 logg = logging.getLogger(__name__)
 
+# Thread pool size for the init_*_objects procfs / sysfs scans
+_INIT_MAX_WORKERS = 32
+
+
+@functools.lru_cache(maxsize=None)
+def _numa_set_to_idx() -> dict[frozenset[int], int]:
+    # Reverse lookup of tl.NUMA_CPULIST: CPU set -> NUMA node
+    # Built on first use, not on import, to keep the topology load lazy.
+    return {cpus: node for node, cpus in enumerate(tl.NUMA_CPULIST)}
+
 
 def check_command(command: str, expect_retcode: int | None = None) -> None:
     '''
@@ -49,13 +57,37 @@ def check_command(command: str, expect_retcode: int | None = None) -> None:
             f'Program {command} not installed / not working properly.')
 
 
-def update_from_proc_interrupts(irq_list: list[IRQ]) -> None:
+# /proc/interrupts fd and read buffer, kept across polls
+_PROC_INT_FD: int | None = None
+_PROC_INT_BUF = bytearray(1 << 20)
+
+
+def _read_proc_interrupts() -> bytes:
+    '''
+    Whole /proc/interrupts in a single read syscall: a consistent kernel snapshot.
+    '''
+    global _PROC_INT_FD, _PROC_INT_BUF
+    if _PROC_INT_FD is None:
+        _PROC_INT_FD = os.open('/proc/interrupts', os.O_RDONLY)
+
+    while True:
+        n = os.preadv(_PROC_INT_FD, [_PROC_INT_BUF], 0)
+        if n < len(_PROC_INT_BUF):
+            return bytes(memoryview(_PROC_INT_BUF)[:n])
+        # Filled the buffer - may be truncated. Grow and retry.
+        _PROC_INT_BUF = bytearray(2 * len(_PROC_INT_BUF))
+
+
+def update_from_proc_interrupts(irqs: IRQTable | list[IRQ]) -> None:
     '''
         Stolen from the /proc/interrupts parser of Redhat's insight package
+
+        Pass an IRQTable when polling the same IRQs repeatedly: one vectorized update.
+        A list updates each IRQ through the table it already belongs to.
     '''
 
     time_now = time.time()
-    content = tl.procfs_read('/proc/interrupts')
+    content = _read_proc_interrupts().splitlines()
 
     logg.debug(f'update_from_proc_interrupts')
 
@@ -66,49 +98,68 @@ def update_from_proc_interrupts(irq_list: list[IRQ]) -> None:
         logg.critical(msg)
         raise AssertionError(msg)
 
-    if len(cpu_names) < 1 or not cpu_names[0].startswith("CPU"):
+    if len(cpu_names) < 1 or not cpu_names[0].startswith(b"CPU"):
         msg = "Unable to determine number of CPUs in /proc/interrupts"
         logg.critical(msg)
         raise AssertionError(
             "Unable to determine number of CPUs in /proc/interrupts")
 
-    data = SortedDict()
+    ncpu = len(cpu_names)
+    names: list[bytes] = []
+    numerics: list[bytes] = []
 
     for line in content[1:]:
-        parts = line.split(None, len(cpu_names) + 1)
-
-        irq_name = parts[0].replace(":", "")
-        one_int: dict[str, typ.Any] = {}
-        one_int['num_cpus'] = len(cpu_names)
-        counts = []
-        if len(parts) == len(cpu_names) + 2:
-            one_int['type_device'] = parts[-1]
-            for part, cpu in zip(parts[1:-1], cpu_names):
-                counts.append(int(part))
-        else:
-            for part, cpu in zip(parts[1:], cpu_names):
-                counts.append(int(part))
-        one_int['counts'] = np.asarray(counts)
+        colon = line.find(b':')
 
-        data[irq_name] = one_int
+        # Counts, optionally followed by a device description.
+        numeric = line[colon + 1:]
+        parts = numeric.split(None, ncpu)
+        if len(parts) < ncpu:
+            continue  # ERR, MIS: a single global count, not per-CPU.
+        if len(parts) == ncpu + 1:
+            numeric = numeric[:-len(parts[-1])]
 
-    if len(data) < 1:
+        names.append(line[:colon].strip())
+        numerics.append(numeric)
+
+    if len(names) < 1:
         msg = "No information in /proc/interrupts"
         logg.critical(msg)
         raise AssertionError(msg)
 
-    for irq in irq_list:
-        if str(irq.id) in data:
-            irq.update_counts(time_now, data[str(irq.id)]['counts'])
+    # Single parse into one (N_irqs, N_cpus) matrix, rows looked up by name.
+    all_counts = np.fromstring(b' '.join(numerics), dtype=np.int64,
+                               sep=' ').reshape(len(names), ncpu)
+    name_to_row = {name: row for row, name in enumerate(names)}
+
+    # Update each IRQ in place, in the table it already belongs to.
+    rows_by_table: dict[IRQTable, np.ndarray]
+    if isinstance(irqs, IRQTable):
+        rows_by_table = {irqs: np.arange(len(irqs.irqs))}
+    else:
+        grouped: dict[IRQTable, list[int]] = defaultdict(list)
+        for irq in irqs:
+            grouped[irq._get_table()].append(irq._table_row)
+        rows_by_table = {
+            table: np.array(rows, np.intp)
+            for table, rows in grouped.items()
+        }
+
+    for table, rows in rows_by_table.items():
+        # Table rows found in /proc/interrupts, and their matching parsed rows.
+        src_rows = np.array([
+            name_to_row.get(b'%d' % irq_id, -1) for irq_id in table.ids[rows]
+        ], np.intp)
+        found = np.flatnonzero(src_rows >= 0)
+        table.update_counts(time_now, all_counts[src_rows[found]], rows[found])
 
 
 def init_irq_objects() -> list[IRQ]:
     irq_fold = '/proc/irq'
 
-    irq_names = [
-        f.split('/')[-1] for f in glob.glob(irq_fold + '/*')
-        if os.path.isdir(f)
-    ]
+    # readdir d_type: no stat() per entry.
+    with os.scandir(irq_fold) as it:
+        irq_names = [entry.name for entry in it if entry.is_dir()]
 
     irq_objs = [IRQ(int(name)) for name in irq_names]
 
@@ -116,25 +167,78 @@ def init_irq_objects() -> list[IRQ]:
     return irq_objs
 
 
-def init_kthread_objects() -> list[KThread]:
+# /proc/<pid>/stat policy field -> ps "cls" column
+_SCHED_POLICY_TO_CLS = {
+    0: 'TS',  # SCHED_OTHER
+    1: 'FF',  # SCHED_FIFO
+    2: 'RR',  # SCHED_RR
+    3: 'B',  # SCHED_BATCH
+    5: 'IDL',  # SCHED_IDLE
+    6: 'DLN',  # SCHED_DEADLINE
+}
 
-    kthread_raw_list = sproc.run(
-        ['ps', '--ppid', '2', '-p', '2', '-o', 'pid,cls,cmd'],
-        stdout=sproc.PIPE).stdout.decode().split('\n')[1:-1]
-    # [1:-1]: Remove title and empty line at end.
-    # cmd must be last to avoid truncation
 
-    kthread_list: list[KThread] = []
+def _init_one_kthread(pid: int) -> KThread | None:
+    '''
+    Build the KThread for pid, or None if pid is not kthreadd / a child of kthreadd.
+    '''
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+
+        # comm may contain spaces and parentheses - split on the last ')'
+        rparen = stat.rfind(b')')
+        # fields[0] is stat field 3 (state): ppid is field 4, policy field 41.
+        # Don't split past the policy.
+        fields = stat[rparen + 2:].split(None, 39)
+        ppid = int(fields[1])
+        if pid != 2 and ppid != 2:
+            return None
+
+        comm = stat[stat.find(b'(') + 1:rparen].decode()
+        cls = _SCHED_POLICY_TO_CLS.get(int(fields[38]), '?')
+        kt = KThread(pid=pid, name=f'[{comm}]', sched_cls=cls)
+        kt.refresh_contents()
+    except (FileNotFoundError, ProcessLookupError):
+        return None  # Process has terminated since the scandir.
+
+    return kt
 
-    ps_regex = re.compile(' *(\d+) *([A-Z]+) *(\[.*\])')
 
-    for kthread_raw in kthread_raw_list:
-        # Use a regex for parsing the output of ps
-        p_str, cls, name = ps_regex.findall(kthread_raw)[0]
-        kthread_list.append(KThread(pid=int(p_str), name=name, sched_cls=cls))
+def init_kthread_objects() -> list[KThread]:
 
-    for kt in kthread_list:
-        kt.refresh_contents()
+    # Walk /proc for kthreadd (pid 2) and its children, equivalent to
+    # ps --ppid 2 -p 2 -o pid,cls,cmd
+    with os.scandir('/proc') as it:
+        pids = sorted(int(e.name) for e in it if e.name.isdigit())
+
+    # Out of fds with all workers reading at once (low RLIMIT_NOFILE):
+    # those pids get another go one at a time below.
+    retry_pids: list[int] = []
+
+    def init_or_defer(pid: int) -> KThread | None:
+        try:
+            return _init_one_kthread(pid)
+        except OSError as exc:
+            if exc.errno not in (errno.EMFILE, errno.ENFILE):
+                raise
+            retry_pids.append(pid)
+            return None
+
+    # Syscall-bound: the GIL is released during the procfs reads.
+    with ThreadPoolExecutor(max_workers=_INIT_MAX_WORKERS) as pool:
+        kthread_list = [
+            kt for kt in pool.map(init_or_defer, pids) if kt is not None
+        ]
+
+    if retry_pids:
+        logg.warning(f'init_kthread_objects: out of fds, '
+                     f'retrying {len(retry_pids)} pids serially.')
+        for pid in sorted(retry_pids):
+            kt = _init_one_kthread(pid)
+            if kt is not None:
+                kthread_list.append(kt)
+        kthread_list.sort(key=lambda kt: kt.pid)
 
     logg.info(
         f'init_kthread_objects: found {len(kthread_list)} /proc/irq items.')
@@ -147,18 +251,35 @@ def filter_network_kthreads(all_kthreads: list[KThread],
     return []
 
 
-def identify_fg_objs(irq_list: list[IRQ], driver: str) -> list[EDTObject]:
-    # Identify the EDT irqs.
-    fg_objs = [
-        EDTObject(irq=irq) for irq in irq_list
-        if (irq.pci_device is not None and irq.pci_device.driver == driver)
-    ]
+def irqs_by_driver(irq_list: list[IRQ]) -> defaultdict[str, list[IRQ]]:
+    '''
+    Bucket the PCI-backed IRQs by their device driver, in one pass.
+    Missing drivers read as empty lists.
+    '''
+    by_driver: defaultdict[str, list[IRQ]] = defaultdict(list)
+    for irq in irq_list:
+        if irq.pci_device is not None:
+            by_driver[irq.pci_device.driver].append(irq)
+
+    return by_driver
+
+
+def make_fg_objs(irqs: list[IRQ]) -> list[EDTObject]:
+    fg_objs = [EDTObject(irq=irq) for irq in irqs]
     fg_objs.sort(key=lambda e: e.pci_device.pci_addr
                  )  # PCI addr order == pdv obj order.
 
     return fg_objs
 
 
+def identify_fg_objs(irq_list: list[IRQ], driver: str) -> list[EDTObject]:
+    # Identify the EDT irqs.
+    return make_fg_objs([
+        irq for irq in irq_list
+        if (irq.pci_device is not None and irq.pci_device.driver == driver)
+    ])
+
+
 def identify_net_objs(irq_list: list[IRQ], iface: str) -> list[EDTObject]:
     net_objs = [
         EDTObject(irq=irq) for irq in irq_list
@@ -170,9 +291,6 @@ def identify_net_objs(irq_list: list[IRQ], iface: str) -> list[EDTObject]:
 def init_pci_objects() -> list[PCIDevice]:
     pci_fold = '/sys/bus/pci/devices'
 
-    devices = glob.glob(pci_fold + '/*')
-    dev_objs = []
-
     # For mapping modules to PCI devices
     lsmod = tl.parse_lsmod()
     procpci = tl.procfs_read('/proc/bus/pci/devices')
@@ -186,59 +304,66 @@ def init_pci_objects() -> list[PCIDevice]:
     # this might get really old, really quickly.
 
     # For mapping network interfaces to PCI devices
-    raw_netpci = sproc.run(
-        'grep -H PCI_SLOT_NAME /sys/class/net/*/device/uevent',
-        shell=True,
-        stdout=sproc.PIPE).stdout.decode().rstrip().split('\n')
-    re_netpci = re.compile(
-        '^/sys/class/net/(.*)/device/uevent:PCI_SLOT_NAME=(.*)$')
     netpci_dict: dict[str, str] = {}
-    for iface_line in raw_netpci:
-        _match = re_netpci.findall(iface_line)[0]
-        netpci_dict[_match[1]] = _match[0]
+    with os.scandir('/sys/class/net') as it:
+        for iface_entry in it:
+            try:
+                uevent = tl.procfs_read_bytes(
+                    f'{iface_entry.path}/device/uevent')
+            except FileNotFoundError:
+                continue  # Virtual interface, no backing device.
+            start = uevent.find(b'PCI_SLOT_NAME=')
+            if start < 0:
+                continue
+            slot = uevent[start + len(b'PCI_SLOT_NAME='):].split(b'\n', 1)[0]
+            netpci_dict[slot.decode()] = iface_entry.name
 
     netpci_dict_shortaddr = {s[5:]: netpci_dict[s] for s in netpci_dict}
     logg.warning(f'PCI/network mappings found: {netpci_dict_shortaddr}')
 
     pcidev_switch_blacklist = tl.parse_lspci_for_pci_switches()
 
-    for fullpath_addr in devices:
-        pci_addr = fullpath_addr.split('/')[-1]  # 0000:XX:YY.Z
+    def init_one_device(entry: os.DirEntry[str]) -> PCIDevice | None:
+        fullpath_addr = entry.path
+        pci_addr = entry.name  # 0000:XX:YY.Z
         addr_4ch = pci_addr.split('.')[0].replace(':', '')[4:]  # XXYY
 
         if addr_4ch in pcidev_switch_blacklist:
             # Bypass PCI switches.
             # They're a problem because they share the interrupt with
             # the leaf PCI devices.
-            continue
+            return None
 
-        if os.path.isdir(f'{fullpath_addr}/msi_irqs'):
+        # Try the reads directly rather than stat()-ing first.
+        try:
             irq_type = IRQ_TYPE.MSI
             irq_list = [
                 int(x) for x in os.listdir(f'{fullpath_addr}/msi_irqs')
             ]
-        elif os.path.isfile(f'{fullpath_addr}/irq'):
-            irq_type = IRQ_TYPE.LEGACY
-            irq_list = [int(tl.procfs_read(f'{fullpath_addr}/irq')[0])]
-        else:
-            irq_type = IRQ_TYPE.NONE
-            irq_list = []
+        except FileNotFoundError:
+            try:
+                irq_type = IRQ_TYPE.LEGACY
+                irq_list = [
+                    int(tl.procfs_read_first_line(f'{fullpath_addr}/irq'))
+                ]
+            except FileNotFoundError:
+                irq_type = IRQ_TYPE.NONE
+                irq_list = []
 
         cpus = set(
             tl.range_to_list(
-                tl.procfs_read(f'{fullpath_addr}/local_cpulist')[0]))
+                tl.procfs_read_first_line(f'{fullpath_addr}/local_cpulist')))
 
         if cpus == tl.ALL_CPUS:
             numa = -1
         else:
-            numa = tl.NUMA_CPULIST.index(cpus)
+            numa = _numa_set_to_idx().get(frozenset(cpus), -1)
 
         dev = PCIDevice(pci_addr=pci_addr,
                         irq_type=irq_type,
                         irq_list=irq_list,
                         cpu_set=cpus,
                         numa_node=numa)
-        dev_objs.append(dev)
 
         # Now map kernel module to PCI device.
         module = procpci_dict.get(addr_4ch, '')
@@ -251,6 +376,16 @@ def init_pci_objects() -> list[PCIDevice]:
         if pci_addr in netpci_dict:
             dev.add_network_iface(netpci_dict[pci_addr])
 
+        return dev
+
+    # Devices are independent, and the work is syscall-bound.
+    with os.scandir(pci_fold) as devices:
+        with ThreadPoolExecutor(max_workers=_INIT_MAX_WORKERS) as pool:
+            dev_objs = [
+                dev for dev in pool.map(init_one_device, devices)
+                if dev is not None
+            ]
+
     logg.info(f'init_pci_objects: found {len(dev_objs)} PCIe items.')
     devs_with_named_driver: set[PCIDevice] = {d for d in dev_objs if d.driver}
     drivers_with_pci_obj: set[str] = {d.driver for d in devs_with_named_driver}
@@ -270,12 +405,11 @@ def match_irq_and_pci(irqs: list[IRQ], devs: list[PCIDevice]) -> None:
     # by both the device itself and an upstream PCI switch.
     # Just keep the highest PCI adress?
     # But what in the case of master/aux devices (e.g nvidia video XX.0 and sound at XX.1)
-    for dev in devs:
+    # Iterate by increasing PCI address so the highest one overwrites
+    # the others. Hotfixin' in case of dual IRQ-claiming
+    for dev in sorted(devs, key=lambda d: d.pci_addr):
         for pci_irq in dev.irq_list:
-            if ((not pci_irq in reverse_lookup) or
-                (reverse_lookup[pci_irq].pci_addr <
-                 dev.pci_addr)):  # Hotfixin' in case of dual IRQ-claiming
-                reverse_lookup[pci_irq] = dev
+            reverse_lookup[pci_irq] = dev
 
     for irq in irqs:
         if irq.id in reverse_lookup:
@@ -309,19 +443,47 @@ def match_kthread_and_irq(irqs: list[IRQ], kthreads: list[KThread]) -> None:
         f'match_irq_and_pci: Matched {len(irq_has_kt)} IRQ/KThread pairs.')
 
 
+def _locate_cpusets() -> tuple[str, str] | None:
+    '''
+    (mount point, CPU list file name) of the v1 cpuset hierarchy, like cpuset.cset does.
+    '''
+    for mount in tl.procfs_read('/proc/mounts'):
+        _, mountpoint, fstype, options = mount.split()[:4]
+        if fstype == 'cpuset' or (fstype == 'cgroup'
+                                  and 'cpuset' in options.split(',')):
+            # Mounted as a cgroup controller: prefixed file names.
+            if os.path.exists(f'{mountpoint}/cpus'):
+                return mountpoint, 'cpus'
+            return mountpoint, 'cpuset.cpus'
+
+    # No fallback to cgroup v2: cset only manages v1 cpusets, the v2 cgroups are systemd's.
+    return None
+
+
 def rescan_cpusets() -> dict[str, CPUSpec]:
-    ''' Either /usr/bin/python, or pip install cpuset-py3 in user distro '''
+    '''
+    Cpusets by path relative to the hierarchy root ('/' is the root set),
+    read straight from the cgroup filesystem.
+    '''
     logg.debug('rescan_cpusets()')
 
-    from cpuset import cset
+    located = _locate_cpusets()
+    if located is None:
+        logg.warning('rescan_cpusets: no cgroup v1 cpuset hierarchy mounted.')
+        return {}
+    mountpoint, cpus_file = located
 
-    _ = cset.CpuSet()
-    sets: dict[str, cset.CpuSet] = cset.CpuSet.sets
+    my_sets: dict[str, CPUSpec] = {}
+    for folder, _, _ in os.walk(mountpoint):
+        try:
+            cpus = tl.procfs_read_first_line(f'{folder}/{cpus_file}')
+        except FileNotFoundError:
+            continue  # Gone since the walk listed it.
+
+        path = folder[len(mountpoint):] or '/'
+        name = 'root' if path == '/' else os.path.basename(path)
+        my_sets[path] = cached_cpuspec(name, frozenset(tl.range_to_list(cpus)))
 
-    my_sets = {
-        name: CPUSpec(sets[name].name, str_spec=sets[name].getcpus())
-        for name in sets
-    }
     logg.info(f'rescan_cpusets: found {len(my_sets)} - {my_sets}')
     return my_sets
 
@@ -342,16 +504,21 @@ if __name__ == "__main__":
         if irq.pci_device and irq.pci_device.driver == 'mlx5_core'
     ]
 
+    mlx_table = IRQTable(mlxirqs)
+
     for i in range(0):
         time.sleep(1.0)
-        update_from_proc_interrupts(mlxirqs)
-        mlxirqs.sort(key=lambda irq: sum(irq._counts_hz), reverse=True)
+        update_from_proc_interrupts(mlx_table)
+        mlxirqs.sort(key=lambda irq: irq._total_hz, reverse=True)
 
         print(f'----------- {time.time() % 1000}')
         for irq in mlxirqs:
-            irq.refresh_contents()
-        fastirqs = [i for i in mlxirqs if sum(i._counts_hz) > 1000]
+            irq.refresh_contents(keep_fds=True)
+        fastirqs = mlx_table.fast_irqs(1000.0)
         fastirqs.sort(key=lambda x: x.id)
         for irq in fastirqs:
             print(irq)
-            print(f'{sum(irq._counts_hz):.2f} Hz.')
+            print(f'{irq._total_hz:.2f} Hz.')
+
+    for irq in mlxirqs:
+        irq.close()
@@ -5,6 +5,7 @@ if typ.TYPE_CHECKING:
     from .pcidevices import PCIDevice
     from .kthread import KThread
 
+import os
 import logging
 
 logg = logging.getLogger(__name__)
@@ -32,11 +33,9 @@ class IRQ:
 
         # I don't do affinity_hint since I expect irqbalance to be off on a RT machine.
 
+        # Masks only - the _list forms are properties built on demand.
         self._smp_affinity: int = 0x0
-        self._smp_affinity_list: list[int] = []
-
         self._eff_affinity: int = 0x0
-        self._eff_affinity_list: list[int] = []
 
         self.best_node: int = -2
         self.pci_device: PCIDevice | None = None
@@ -47,48 +46,130 @@ class IRQ:
         self._unhandled: int = 0
         self._last_unhandled_ms: int = 0
 
-        self._counts: np.ndarray[typ.Any, np.dtype[np.int64]] = np.zeros(
-            tl.CPU_COUNT, np.int64)
-        self._counts_time: float = 0
-        self._counts_hz: np.ndarray[typ.Any, np.dtype[np.float64]] = np.zeros(
-            tl.CPU_COUNT, np.float64)
+        # Counts live in a row of an IRQTable - alone in its own, made on first
+        # use, until grouped with other IRQs.
+        self._table: IRQTable | None = None
+        self._table_row: int = 0
 
         self.was_pinned_successfully_once = False
 
+        # Raw procfs contents at last refresh, and their open fds when polled.
+        self._procfs_fds: dict[str, int] = {}
+        self._smp_affinity_raw: bytes = b''
+        self._eff_affinity_raw: bytes = b''
+        self._spurious_raw: bytes = b''
+
         self.refresh_contents()
 
     def __repr__(self) -> str:
         s = (
-            f'IRQ {self.id:3d} - Allowed {tl.list_to_range_notation(self._smp_affinity_list)}; '
-            f'current {tl.list_to_range_notation(self._eff_affinity_list)}')
+            f'IRQ {self.id:3d} - Allowed {tl.sorted_list_to_range_notation(self._smp_affinity_list)}; '
+            f'current {tl.sorted_list_to_range_notation(self._eff_affinity_list)}'
+        )
         if self.pci_device:
             s += f' -- PCI dev {self.pci_device.pci_addr} (drv {self.pci_device.driver}) - NUMA {self.best_node}.'
 
         return s
 
+    @property
+    def _smp_affinity_list(self) -> list[int]:
+        return tl.mask_to_list(self._smp_affinity)
+
+    @property
+    def _eff_affinity_list(self) -> list[int]:
+        return tl.mask_to_list(self._eff_affinity)
+
+    def _get_table(self) -> IRQTable:
+        if self._table is None:
+            IRQTable([self])
+        assert self._table is not None
+        return self._table
+
+    @property
+    def _counts(self) -> np.ndarray[typ.Any, np.dtype[np.int64]]:
+        return self._get_table().counts[self._table_row]
+
+    @property
+    def _counts_hz(self) -> np.ndarray[typ.Any, np.dtype[np.float64]]:
+        return self._get_table().counts_hz[self._table_row]
+
+    @property
+    def _total_hz(self) -> float:
+        return float(self._get_table().total_hz[self._table_row])
+
+    @property
+    def _counts_time(self) -> float:
+        return float(self._get_table().counts_time[self._table_row])
+
     def update_counts(self, time_now: float, counts: np.ndarray) -> None:
         logg.debug('IRQ::update_counts()')
 
         assert len(counts) == tl.CPU_COUNT
 
-        self._counts_hz = (counts - self._counts) / \
-                           (time_now - self._counts_time)
-        self._counts_time = time_now
-        self._counts = counts
-
-    def refresh_contents(self) -> None:
+        self._get_table().update_counts(time_now, counts[None, :],
+                                        np.array([self._table_row]))
+
+    def _pread(self, file: str, keep_fd: bool) -> bytes:
+        fd = self._procfs_fds.get(file)
+        if fd is not None:
+            return os.pread(fd, 4096, 0)
+
+        path = f'{self.procfs_folder}/{file}'
+        if keep_fd:
+            # Polling: long-lived fd, re-read with pread - no open/close per refresh.
+            fd = tl.open_held_fd(lambda: os.open(path, os.O_RDONLY))
+            if fd is not None:
+                self._procfs_fds[file] = fd
+                return os.pread(fd, 4096, 0)
+            logg.debug('IRQ::_pread %d: out of fd budget, not keeping %s',
+                       self.id, file)
+
+        return tl.procfs_read_bytes(path)
+
+    def close(self) -> None:
+        '''
+        Close the procfs fds kept open by polling. Further refreshes still work.
+        '''
+        for fd in self._procfs_fds.values():
+            tl.close_held_fd(fd)
+        self._procfs_fds.clear()
+
+    def __enter__(self) -> IRQ:
+        return self
+
+    def __exit__(self, *exc_info: typ.Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        # Last resort only - call close() when done polling.
+        if getattr(self, '_procfs_fds', None):
+            self.close()
+
+    def refresh_contents(self, keep_fds: bool = False) -> None:
+        '''
+        keep_fds: polling loop - keep the procfs files open for the next refreshes,
+        until close().
+        '''
         logg.debug('IRQ::refresh_contents()')
-        self._smp_affinity = tl.maskstr_to_int(
-            self.procfs_read('smp_affinity')[0])
-        self._smp_affinity_list = tl.mask_to_list(self._smp_affinity)
-        self._eff_affinity = tl.maskstr_to_int(
-            self.procfs_read('effective_affinity')[0])
-        self._eff_affinity_list = tl.mask_to_list(self._eff_affinity)
-
-        spurious = self.procfs_read('spurious')
-        self._count = int(spurious[0].split()[1])
-        self._unhandled = int(spurious[1].split()[1])
-        self._last_unhandled_ms = int(spurious[2].split()[1])
+
+        # Only re-parse what changed since the last refresh.
+        smp_affinity = self._pread('smp_affinity', keep_fds)
+        if smp_affinity != self._smp_affinity_raw:
+            self._smp_affinity_raw = smp_affinity
+            self._smp_affinity = tl.maskstr_to_int(smp_affinity.decode())
+
+        eff_affinity = self._pread('effective_affinity', keep_fds)
+        if eff_affinity != self._eff_affinity_raw:
+            self._eff_affinity_raw = eff_affinity
+            self._eff_affinity = tl.maskstr_to_int(eff_affinity.decode())
+
+        spurious = self._pread('spurious', keep_fds)
+        if spurious != self._spurious_raw:
+            self._spurious_raw = spurious
+            spurious_lines = spurious.splitlines()
+            self._count = int(spurious_lines[0].split()[1])
+            self._unhandled = int(spurious_lines[1].split()[1])
+            self._last_unhandled_ms = int(spurious_lines[2].split()[1])
 
     def register_pci_device(self, dev: PCIDevice) -> None:
         logg.info(f'IRQ::register_pci_device() {dev} onto IRQ {self}')
@@ -109,7 +190,7 @@ class IRQ:
     def get_pin_to_cpu(self) -> list[int]:
         self.refresh_contents()
         logg.info(
-            f'IRQ::get_pin_to_cpu(): IRQ {self.id} bound to {tl.list_to_range_notation(self._smp_affinity_list)}'
+            f'IRQ::get_pin_to_cpu(): IRQ {self.id} bound to {tl.sorted_list_to_range_notation(self._smp_affinity_list)}'
         )
         return self._smp_affinity_list
 
@@ -126,8 +207,8 @@ class IRQ:
         cpu_list_effective = cpu_list
 
         if self.best_node >= 0:  # Has a preferred NUMA node
-            superset_bool = set(
-                tl.NUMA_CPULIST[self.best_node]).issuperset(cpu_list)
+            superset_bool = tl.NUMA_CPULIST[self.best_node].issuperset(
+                cpu_list)
             if not superset_bool:
                 if numaify_subset_ok:
                     # intersect cpu_list with the preferred node.
@@ -147,7 +228,7 @@ class IRQ:
         except OSError:
             logg.debug(
                 f'IRQ::set_pin_to_cpu OSError - irq: {self.id} - '
-                f'SMP current: {tl.list_to_range_notation(self._smp_affinity_list)} - '
+                f'SMP current: {tl.sorted_list_to_range_notation(self._smp_affinity_list)} - '
                 f'SMP tried: {tl.list_to_range_notation(cpu_list)}')
 
         pinned = self.get_pin_to_cpu()
@@ -155,3 +236,83 @@ class IRQ:
             self.was_pinned_successfully_once = True
 
         return pinned
+
+
+class IRQTable:
+    '''
+    Interrupt counts of a list of IRQs, one row per IRQ (structure of arrays).
+    Each IRQ reads its counts back through a view on its row.
+    '''
+
+    def __init__(self, irqs: list[IRQ]) -> None:
+        logg.debug(f'IRQTable::__init__ {len(irqs)} IRQs')
+
+        self.irqs = list(irqs)
+        n_irqs = len(self.irqs)
+
+        self.ids = np.array([irq.id for irq in self.irqs], np.int32)
+        self.counts: np.ndarray[typ.Any, np.dtype[np.int64]] = np.zeros(
+            (n_irqs, tl.CPU_COUNT), np.int64)
+        self.counts_time: np.ndarray[typ.Any, np.dtype[np.float64]] = np.zeros(
+            n_irqs, np.float64)
+        self.counts_hz: np.ndarray[typ.Any, np.dtype[np.float64]] = np.zeros(
+            (n_irqs, tl.CPU_COUNT), np.float64)
+        self.total_hz: np.ndarray[typ.Any, np.dtype[np.float64]] = np.zeros(
+            n_irqs, np.float64)
+
+        # An IRQ belongs to one table at a time: take its rows from the previous one.
+        moved_rows: dict[IRQTable, list[int]] = {}
+        for row, irq in enumerate(self.irqs):
+            old_table, old_row = irq._table, irq._table_row
+            if old_table is not None:  # Carry over the history
+                self.counts[row] = old_table.counts[old_row]
+                self.counts_time[row] = old_table.counts_time[old_row]
+                self.counts_hz[row] = old_table.counts_hz[old_row]
+                self.total_hz[row] = old_table.total_hz[old_row]
+                moved_rows.setdefault(old_table, []).append(old_row)
+            irq._table, irq._table_row = self, row
+
+        for old_table, rows in moved_rows.items():
+            old_table._drop_rows(rows)
+
+    def _drop_rows(self, rows: list[int]) -> None:
+        '''
+        Forget rows whose IRQs moved to another table, renumber the remaining ones.
+        '''
+        keep = np.setdiff1d(np.arange(len(self.irqs)), rows)
+
+        self.irqs = [self.irqs[row] for row in keep]
+        self.ids = self.ids[keep]
+        self.counts = self.counts[keep]
+        self.counts_time = self.counts_time[keep]
+        self.counts_hz = self.counts_hz[keep]
+        self.total_hz = self.total_hz[keep]
+
+        for row, irq in enumerate(self.irqs):
+            irq._table_row = row
+
+    def update_counts(self,
+                      time_now: float,
+                      counts: np.ndarray,
+                      rows: np.ndarray | None = None) -> None:
+        '''
+        counts: (len(rows), CPU_COUNT) matrix - rows: table rows it maps to, default all.
+        '''
+        logg.debug('IRQTable::update_counts()')
+
+        if rows is None:
+            rows = np.arange(len(self.irqs))
+
+        dt = time_now - self.counts_time[rows]
+        counts_hz = (counts - self.counts[rows]) / dt[:, None]
+
+        self.counts_hz[rows] = counts_hz
+        self.total_hz[rows] = counts_hz.sum(axis=1)
+        self.counts_time[rows] = time_now
+        self.counts[rows] = counts
+
+    def fast_irqs(self, threshold_hz: float) -> list[IRQ]:
+        return [
+            self.irqs[row]
+            for row in np.flatnonzero(self.total_hz > threshold_hz)
+        ]
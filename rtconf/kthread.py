@@ -4,13 +4,13 @@ import typing as typ
 if typ.TYPE_CHECKING:
     from .irqs import IRQ
 
-from .cset import CPUSpec
+from .cset import CPUSpec, cached_cpuspec
 from . import tools as tl
 
 import os
 import logging as logg
 import time
-import subprocess as sproc
+import select
 
 from enum import Enum
 
@@ -19,6 +19,17 @@ import logging
 logg = logging.getLogger(__name__)
 
 
+def _sched_field(sched: bytes, key: bytes) -> bytes:
+    '''
+    Raw value of the "key : value" line of a /proc/<pid>/sched dump.
+    '''
+    start = sched.find(b'\n' + key + b' ')
+    if start < 0:
+        raise KeyError(key.decode())
+    start = sched.index(b':', start) + 1
+    return sched[start:sched.index(b'\n', start)]
+
+
 class KThreadTypeEnum(Enum):
     # General stuff - but detailing avoids the _missing_ warning.
     KWORKER = 'kworker'
@@ -68,6 +79,14 @@ class KThread:  # Actually any process...
         self.pid = pid
         self.name = name
 
+        self._pidfd: int | None = None
+        try:
+            self._pidfd = tl.open_held_fd(lambda: os.pidfd_open(pid))
+        except OSError:
+            # Already gone (alive() will tell), or no pidfd support.
+            pass
+        # No pidfd (also when out of the fd budget): alive() falls back to os.kill
+
         self._alive: bool = True
         self.alive()  # Actually check if alive
 
@@ -101,6 +120,7 @@ class KThread:  # Actually any process...
             self._rcuc_cpu = int(slashsplit[1])
 
         self.was_cset_successfully_once = False
+        self._taskset_cache: tuple[frozenset[int], CPUSpec] | None = None
 
         self._runtime, self._runtime_incr = 0.0, 0.0
         self._migrations, self._migrations_incr = 0, 0
@@ -108,62 +128,97 @@ class KThread:  # Actually any process...
         self._nr_sw_vol, self._nr_sw_vol_incr = 0, 0
         self._nr_sw_unvol, self._nr_sw_unvol_incr = 0, 0
 
+        self._sched_raw: bytes = b''
         self._dt_last_contents = 0.0
         self._time_last_contents = 0.0
 
         self.refresh_contents()
 
+    def __del__(self) -> None:
+        self._close_pidfd()
+
+    def _close_pidfd(self) -> None:
+        pidfd = getattr(self, '_pidfd', None)
+        if pidfd is not None:
+            tl.close_held_fd(pidfd)
+            self._pidfd = None
+
     def alive(self) -> bool:
         if not self._alive:  # it died once...
             return False
-        try:
-            os.kill(self.pid, 0)
-        except PermissionError:
-            return True
-        except ProcessLookupError:
+
+        if self._pidfd is not None:
+            # pidfd becomes readable when the process exits - and can't alias a reused pid.
+            poller = select.poll()
+            poller.register(self._pidfd, select.POLLIN)
+            terminated = len(poller.poll(0)) > 0
+        else:
+            try:
+                os.kill(self.pid, 0)
+            except PermissionError:
+                terminated = False
+            except ProcessLookupError:
+                terminated = True
+            else:
+                terminated = False
+
+        if terminated:
             logg.warning(f'KTread::alive - pid {self.pid} has terminated.')
             self._alive = False
+            self._close_pidfd()
             return False
-        else:
-            return True
+
+        return True
 
     def refresh_contents(self) -> None:
         logg.debug(f'KThread::refresh_contents - {self.pid}')
 
-        self._comm = self.procfs_read('comm')[0]
-        self._cpuset = self.procfs_read('cpuset')[0][1:]  # Remove heading /
+        # Pin /proc/<pid> once so all files come from the same process.
+        dir_fd = os.open(f'/proc/{self.pid}', os.O_PATH | os.O_DIRECTORY)
+        try:
+            comm = tl.procfs_read_first_line('comm', dir_fd)
+            cpuset = tl.procfs_read_first_line('cpuset', dir_fd)
+            self._sched_raw = tl.procfs_read_bytes('sched', dir_fd)
+        finally:
+            os.close(dir_fd)
 
-        # Parse sched
-        # scexao6: there are NUMA special lines without ":" at the end of the file
-        # e.g. current_node=0, numa_group_id=0
-        #      numa_faults node=0 task_private=0 task_shared=0 group_private=0 group_shared=0
-        #      numa_faults node=1 task_private=0 task_shared=0 group_private=0 group_shared=0
-        sched_info_lines = [
-            l.split(':') for l in self.procfs_read('sched')[2:] if ':' in l
-        ]
+        self._comm = comm
+        self._cpuset = cpuset[1:]  # Remove heading /
 
-        self.sched_info: dict[str, str] = {
-            l[0].strip(): l[1].strip()
-            for l in sched_info_lines
-        }
+        # Pick the few fields we need straight from the bytes.
+        sched = self._sched_raw
 
-        runtime = float(self.sched_info['se.sum_exec_runtime'])
+        runtime = float(_sched_field(sched, b'se.sum_exec_runtime'))
         self._runtime_incr, self._runtime = runtime - self._runtime, runtime
 
-        migrations = int(self.sched_info['se.nr_migrations'])
+        migrations = int(_sched_field(sched, b'se.nr_migrations'))
         self._migrations_incr, self._migrations = migrations - self._migrations, migrations
 
-        nr_sw = int(self.sched_info['nr_switches'])
+        nr_sw = int(_sched_field(sched, b'nr_switches'))
         self._nr_sw_incr, self._nr_sw = nr_sw - self._nr_sw, nr_sw
-        nr_sw_vol = int(self.sched_info['nr_voluntary_switches'])
+        nr_sw_vol = int(_sched_field(sched, b'nr_voluntary_switches'))
         self._nr_sw_vol_incr, self._nr_sw_vol = nr_sw_vol - self._nr_sw_vol, nr_sw_vol
-        nr_sw_unvol = int(self.sched_info['nr_involuntary_switches'])
+        nr_sw_unvol = int(_sched_field(sched, b'nr_involuntary_switches'))
         self._nr_sw_unvol_incr, self._nr_sw_unvol = nr_sw_unvol - self._nr_sw_unvol, nr_sw_unvol
 
         time_now = time.time()
         self._dt_last_contents = time_now - self._dt_last_contents
         self._time_last_contents = time_now
 
+    @property
+    def sched_info(self) -> dict[str, str]:
+        # Full parse of the last /proc/<pid>/sched read - for inspection only.
+        # scexao6: there are NUMA special lines without ":" at the end of the file
+        # e.g. current_node=0, numa_group_id=0
+        #      numa_faults node=0 task_private=0 task_shared=0 group_private=0 group_shared=0
+        #      numa_faults node=1 task_private=0 task_shared=0 group_private=0 group_shared=0
+        sched_info_lines = [
+            l.split(':') for l in self._sched_raw.decode().splitlines()[2:]
+            if ':' in l
+        ]
+
+        return {l[0].strip(): l[1].strip() for l in sched_info_lines}
+
     @tl.root_decorator
     def procfs_write(self, file: str, content: str) -> None:
         tl.procfs_write(f'/proc/{self.pid}/{file}', content)
@@ -191,29 +246,33 @@ class KThread:  # Actually any process...
             self._alive = False
             affinity: set[int] = set()
 
-        aff_str = tl.list_to_range_notation(list(affinity))
-        logg.info(
-            f'KThread::get_taskset - kt {self.name} {self.pid} lives on taskset {aff_str}.'
-        )
-        return CPUSpec(name=f'kt_anon@{self.pid}', cpu_list=list(affinity))
+        # Only rebuild the CPUSpec if the affinity changed since last call.
+        if self._taskset_cache is None or self._taskset_cache[0] != affinity:
+            frozen_aff = frozenset(affinity)
+            self._taskset_cache = (frozen_aff,
+                                   cached_cpuspec(f'kt_anon@{self.pid}',
+                                                  frozen_aff))
+        taskset = self._taskset_cache[1]
+
+        logg.info('KThread::get_taskset - kt %s %d lives on taskset %s.',
+                  self.name, self.pid, taskset.get_str())
+        return taskset
 
     @tl.root_decorator
     def pin_taskset(self, taskset: CPUSpec) -> None:
-        logg.info(
-            f'KThread::pin_taskset {self.name} {self.pid} onto CPUs {taskset.get_str()}'
-        )
-        cmd = f'taskset -pc {taskset.get_str()} {self.pid}'
-        p = sproc.run(cmd.split(), stdout=sproc.PIPE, stderr=sproc.PIPE)
-        if p.returncode != 0:
+        logg.info('KThread::pin_taskset %s %d onto CPUs %s', self.name,
+                  self.pid, taskset.get_str())
+        try:
+            os.sched_setaffinity(self.pid, taskset.cpu_list)
+        except OSError as exc:
             logg.warning(
-                f'KThread::pin_taskset {self.pid} ({self._comm}) failed (retcode {p.returncode})'
+                f'KThread::pin_taskset {self.pid} ({self._comm}) failed ({exc})'
             )
 
     @tl.root_decorator
     def pin_cset(self, cpuset: CPUSpec) -> None:
-        logg.info(
-            f'KThread::pin_cset {self.name} {self.pid} onto CPUset {cpuset.name} {cpuset.get_str()}'
-        )
+        logg.info('KThread::pin_cset %s %d onto CPUset %s %s', self.name,
+                  self.pid, cpuset.name, cpuset.get_str())
         # Forcey cause sometimes bitchey
         cmd = f'-k -m --force {self.pid} root'
         tl.cset_proc_call(cmd)
@@ -225,7 +284,7 @@ class KThread:  # Actually any process...
 
         self.refresh_contents()
         now_cpuset = self.get_taskset()
-        if set(now_cpuset.cpu_list) != set(cpuset.cpu_list):
+        if now_cpuset.cpu_set != cpuset.cpu_set:
             logg.error(
                 f'KThread::pin_cset {self.pid} ({self._comm}): '
                 f'failed to assign {cpuset.get_str()} - got {now_cpuset.get_str()}'
@@ -237,11 +296,18 @@ class KThread:  # Actually any process...
     def chrt_ff(self, rtprio: int) -> None:
         logg.info(
             f'KThread::chrt_ff {self.name} {self.pid} - priority {rtprio}.')
-        cmd = f'chrt -f -p {rtprio} {self.pid}'
-        p = sproc.run(cmd.split())
+        try:
+            os.sched_setscheduler(self.pid, os.SCHED_FIFO,
+                                  os.sched_param(rtprio))
+        except OSError as exc:
+            logg.warning(
+                f'KThread::chrt_ff {self.pid} ({self._comm}) failed ({exc})')
 
     @tl.root_decorator
     def chrt_oth(self) -> None:
         logg.info(f'KThread::chrt_oth {self.name} {self.pid}.')
-        cmd = f'chrt -o -p 0 {self.pid}'
-        p = sproc.run(cmd.split())
+        try:
+            os.sched_setscheduler(self.pid, os.SCHED_OTHER, os.sched_param(0))
+        except OSError as exc:
+            logg.warning(
+                f'KThread::chrt_oth {self.pid} ({self._comm}) failed ({exc})')
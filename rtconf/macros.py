@@ -7,15 +7,58 @@ if typ.TYPE_CHECKING:
     from .irqs import IRQ
     from .kthread import KThread
 
+import glob
+import os
 import re
 import subprocess as sproc
 
+from concurrent.futures import ThreadPoolExecutor
+
 from . import tools as tl
+from .kthread import KThreadTypeEnum as KTTE
+from .functions import rescan_cpusets
+from .rtlinux_configs import SYSCTL_TWEAK_LIST_NETWORK, SYSCTL_TWEAK_LIST_CPUPERF
 
 import logging
 
 logg = logging.getLogger(__name__)
 
+CPU_SYSFS = '/sys/devices/system/cpu'
+
+# Governor switches take the cpufreq policy locks, issue them concurrently.
+_GOVERNOR_MAX_WORKERS = 16
+# Per-CPU governors in use before cpu_performance_mode_enable, one "file governor" per line.
+_SAVED_GOVERNORS_FILE = '/var/lib/rtconf/saved_governors'
+
+# Whole lines mentioning either key - commented-out defaults included.
+_IRQBALANCE_KEYS_RE = re.compile(
+    r'^.*(IRQBALANCE_BANNED_CPUS|IRQBALANCE_ARGS)=.*$', re.M)
+
+# Quoted contents of the default kernel cmdline in /etc/default/grub
+_GRUB_CMDLINE_RE = re.compile(r'^(GRUB_CMDLINE_LINUX_DEFAULT=")([^"]*)(")',
+                              re.M)
+_IRQAFFINITY_RE = re.compile(r'(^|\s)irqaffinity=\S*')
+
+# Per-CPU kthreads that are expected to stay off the cpusets
+_OK_NOMOVE_KTYPES = frozenset({
+    KTTE.RCUC, KTTE.CPUHP, KTTE.KSOFTIRQD, KTTE.IDLE_INJECT, KTTE.MIGRATION,
+    KTTE.IRQ_WORK
+})
+
+
+def _ethtool(iface: str, *args: str) -> None:
+    # Surface unsupported settings / offloads, but carry on with the rest of the setup.
+    try:
+        p = sproc.run(['ethtool', *args[:1], iface, *args[1:]],
+                      stdout=sproc.PIPE,
+                      stderr=sproc.PIPE)
+    except FileNotFoundError:
+        logg.error('ethtool not installed.')
+        return
+    if p.returncode != 0:
+        logg.error(f'ethtool {args[0]} {iface} failed ({p.returncode}): '
+                   f'{p.stderr.decode().strip()}')
+
 
 @tl.root_decorator
 def network_hiperf_single(dev: PCIDevice) -> None:
@@ -26,24 +69,21 @@ def network_hiperf_single(dev: PCIDevice) -> None:
 
     assert dev.net_iface and dev.net_is_lan
 
-    sproc.run(f'ethtool -C {dev.net_iface} rx-usecs 0', shell=True)
-    sproc.run(f'ethtool -C {dev.net_iface} tx-usecs 0', shell=True)
-    sproc.run(f'ethtool -A {dev.net_iface} autoneg off rx off tx off',
-              shell=True)
+    iface = dev.net_iface
+    _ethtool(iface, '-C', 'rx-usecs', '0', 'tx-usecs', '0')
+    _ethtool(iface, '-A', 'autoneg', 'off', 'rx', 'off', 'tx', 'off')
     # Further stemming from the following line:
     # sudo ethtool -K ens9f1np1 gso off tso off gro off lro off tx off rx off
     # Used on 40G LAN and 100G P2P - this is too much load otherwise on RT packets for
     # the NIC firmware to handle.
-    sproc.run(
-        f'ethtool -K {dev.net_iface} gso off tso off gro off lro off tx off rx off',
-        shell=True)
+    _ethtool(iface, '-K', 'gso', 'off', 'tso', 'off', 'gro', 'off', 'lro',
+             'off', 'tx', 'off', 'rx', 'off')
 
 
 @tl.root_decorator
 def network_generic_all() -> None:
     logg.warning(
         f'network_generic_all() - applying systemctl hiperf network tweaks.')
-    from .rtlinux_configs import SYSCTL_TWEAK_LIST_NETWORK
     tl.sysctl_write_list(SYSCTL_TWEAK_LIST_NETWORK)
 
 
@@ -58,24 +98,18 @@ def hyperthreading_disable() -> None:
     '''
     logg.warning(f'hyperthreading_disable()')
 
-    pfix = '/sys/devices/system/cpu'
-
-    sibling_enumeration_all = sproc.run(
-        f'grep . {pfix}/cpu[0-9]*/topology/thread_siblings_list',
-        shell=True,
-        stdout=sproc.PIPE).stdout.decode().rstrip().split('\n')
-
-    re_parse = re.compile(
-        f'^{pfix}/cpu(\d+)/topology/thread_siblings_list:(\d+)(?:,(\d+))?$')
+    pfix = CPU_SYSFS
 
     found_comma = False
     set_toremove: set[int] = set()
 
-    for cpuline in sibling_enumeration_all:
-        match = re_parse.findall(cpuline)[0]
-        cpu = int(match[0])
+    for siblings_file in sorted(
+            glob.glob(f'{pfix}/cpu[0-9]*/topology/thread_siblings_list')):
+        cpu = int(siblings_file[len(pfix) + 4:].split('/')[0])
 
-        lowest_sibling = int(match[1])
+        # e.g. 3,35 - or 2-3 on some machines.
+        lowest_sibling = min(
+            tl.range_to_list(tl.procfs_read_first_line(siblings_file)))
 
         if lowest_sibling != cpu:
             set_toremove.add(cpu)
@@ -84,41 +118,129 @@ def hyperthreading_disable() -> None:
         # Send a warning to disable in BIOS.
         pass
 
-    for cpu in set_toremove:
-        logg.warning(f'hyperthreading_disable(): setting CPU {cpu} offline.')
-        tl.procfs_write(f'{pfix}/cpu{cpu}/online', '0')
+    # Hotplug serializes in the kernel anyway - one dir fd, openat per CPU.
+    # (procfs_write is a raw os.open / os.write already)
+    dir_fd = os.open(pfix, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        for cpu in sorted(set_toremove):
+            logg.warning(
+                f'hyperthreading_disable(): setting CPU {cpu} offline.')
+            tl.procfs_write(f'cpu{cpu}/online', '0', dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+@tl.root_decorator
+def cpuidle_states_write(states: list[int], disable: bool) -> None:
+    '''
+    Same as cpupower -c all idle-set -d / -e on each of states, in order,
+    but writing the cpuidle sysfs files directly.
+    '''
+    files_by_state: dict[int, list[str]] = {}
+    for file in glob.glob(
+            f'{CPU_SYSFS}/cpu[0-9]*/cpuidle/state[0-9]*/disable'):
+        state = int(file.rsplit('/state', 1)[1].split('/')[0])
+        files_by_state.setdefault(state, []).append(file)
+
+    # Per file: one state the kernel refuses must not block the others.
+    for k in states:
+        for file in files_by_state.get(k, []):
+            try:
+                tl.procfs_write(file, str(int(disable)))
+            except (OSError, tl.ProcfsWriteError) as exc:
+                logg.error(f'cpuidle_states_write: {exc}')
+
+
+@tl.root_decorator
+def cpu_governor_write(governor: str | dict[str, str]) -> None:
+    '''
+    Same as cpupower frequency-set --governor, writing the cpufreq sysfs files directly.
+    governor: one governor for all CPUs, or a scaling_governor file -> governor dict.
+    '''
+    if isinstance(governor, str):
+        governors = {
+            file: governor
+            for file in glob.glob(
+                f'{CPU_SYSFS}/cpu[0-9]*/cpufreq/scaling_governor')
+        }
+    else:
+        governors = governor
+
+    def write_one(file: str) -> None:
+        try:
+            tl.procfs_write(file, governors[file])
+        except (OSError, tl.ProcfsWriteError) as exc:
+            logg.error(f'cpu_governor_write: {exc}')
+
+    with ThreadPoolExecutor(max_workers=_GOVERNOR_MAX_WORKERS) as pool:
+        list(pool.map(write_one, governors))
+
+
+@tl.root_decorator
+def cpu_governor_save() -> None:
+    '''
+    Stash the current per-CPU governors on disk, for cpu_governor_restore.
+    An existing stash is kept: it holds the governors from before the first enable.
+    '''
+    if os.path.exists(_SAVED_GOVERNORS_FILE):
+        logg.info(f'cpu_governor_save: keeping {_SAVED_GOVERNORS_FILE}')
+        return
+
+    lines = [
+        f'{file} {tl.procfs_read_first_line(file)}\n' for file in sorted(
+            glob.glob(f'{CPU_SYSFS}/cpu[0-9]*/cpufreq/scaling_governor'))
+    ]
+    os.makedirs(os.path.dirname(_SAVED_GOVERNORS_FILE), exist_ok=True)
+    tmp_path = _SAVED_GOVERNORS_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, _SAVED_GOVERNORS_FILE)
+
+
+@tl.root_decorator
+def cpu_governor_restore(fallback: str = 'powersave') -> None:
+    '''
+    Write back the governors stashed by cpu_governor_save, and drop the stash.
+    Uses fallback on all CPUs if nothing was stashed.
+    '''
+    try:
+        with open(_SAVED_GOVERNORS_FILE, 'r') as f:
+            governors = dict(line.split() for line in f if line.strip())
+    except FileNotFoundError:
+        logg.warning(
+            f'cpu_governor_restore: no saved governors - using {fallback}')
+        cpu_governor_write(fallback)
+        return
+
+    cpu_governor_write(governors)
+    os.remove(_SAVED_GOVERNORS_FILE)
 
 
 @tl.root_decorator
 def cpu_performance_mode_enable() -> None:
     logg.warning(
-        f'cpu_performance_mode_enable() - sysctl + cpupower + governor')
-    from .rtlinux_configs import SYSCTL_TWEAK_LIST_CPUPERF
+        f'cpu_performance_mode_enable() - sysctl + cpuidle + governor')
     tl.procfs_write_list([(file, on)
                           for (file, on, _) in SYSCTL_TWEAK_LIST_CPUPERF])
 
-    cmd = 'cpupower -c all idle-set -d'  # disable state from deep to shallow
-    for k in range(10, 0, -1):
-        sproc.run(cmd.split(' ') + [str(k)])
+    # disable state from deep to shallow
+    cpuidle_states_write(list(range(10, 0, -1)), disable=True)
 
-    cmd = 'cpupower frequency-set --governor performance'
-    sproc.run(cmd.split(' '))
+    cpu_governor_save()
+    cpu_governor_write('performance')
 
 
 @tl.root_decorator
 def cpu_performance_mode_disable() -> None:
     logg.warning(
-        f'cpu_performance_mode_disable() - sysctl + cpupower + governor')
-    from .rtlinux_configs import SYSCTL_TWEAK_LIST_CPUPERF
+        f'cpu_performance_mode_disable() - sysctl + cpuidle + governor')
     tl.procfs_write_list([(file, off)
                           for (file, _, off) in SYSCTL_TWEAK_LIST_CPUPERF])
 
-    cmd = 'cpupower -c all idle-set -e'  # enable state from shallow to deep
-    for k in range(1, 3):
-        sproc.run(cmd.split(' ') + [str(k)])
+    # enable state from shallow to deep
+    cpuidle_states_write(list(range(1, 3)), disable=False)
 
-    cmd = 'cpupower frequency-set --governor powersave'
-    sproc.run(cmd.split(' '))
+    cpu_governor_restore()
 
 
 @tl.no_root_decorator
@@ -149,52 +271,103 @@ def irq_parking(irqs: list[IRQ], cpus: CPUSpec) -> None:
 
     sproc.run(['systemctl', 'stop', 'irqbalance'])
 
+    # IRQs registered from now on (e.g. driver reloads) start on these CPUs.
+    try:
+        tl.procfs_write('/proc/irq/default_smp_affinity',
+                        tl.int_to_maskstr(tl.list_to_mask(cpus.cpu_list)))
+    except (OSError, tl.ProcfsWriteError) as exc:
+        logg.error(f'irq_parking: default_smp_affinity - {exc}')
+
     # Ideally we want to restart irqbalance excluding banned CPUs and relevant interrupts.
     for irq in irqs:
         # Ideally, we want a numa-aware version of this.
         irq.set_pin_to_cpu(cpus.cpu_list, numaify_subset_ok=True)
 
 
+@tl.root_decorator
+def irqaffinity_kernel_cmdline(cpus: CPUSpec) -> None:
+    '''
+    One-time install step, not part of the per-boot run:
+    set irqaffinity=<cpus> in /etc/default/grub and run update-grub,
+    so the kernel hands out IRQs on the housekeeping CPUs from boot on.
+    '''
+    irqaffinity = f'irqaffinity={cpus.get_str()}'
+    logg.warning(f'irqaffinity_kernel_cmdline() - {irqaffinity}')
+
+    with open('/etc/default/grub', 'r') as f:
+        contents = f.read()
+
+    def set_irqaffinity(m: re.Match[str]) -> str:
+        cmdline, n_subs = _IRQAFFINITY_RE.subn(
+            lambda m_arg: m_arg.group(1) + irqaffinity, m.group(2))
+        if n_subs == 0:
+            cmdline = f'{cmdline} {irqaffinity}'.strip()
+        return m.group(1) + cmdline + m.group(3)
+
+    contents, n_lines = _GRUB_CMDLINE_RE.subn(set_irqaffinity, contents)
+    if n_lines == 0:
+        logg.error(
+            'irqaffinity_kernel_cmdline: no GRUB_CMDLINE_LINUX_DEFAULT in /etc/default/grub'
+        )
+        return
+
+    tmp_path = '/etc/default/grub.rtconf.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(contents)
+    os.replace(tmp_path, '/etc/default/grub')
+
+    sproc.run(['update-grub'])
+
+
 @tl.root_decorator
 def irq_restart(cpus_nobalance: CPUSpec, irqs_nobalance: set[IRQ]) -> None:
 
-    ids = [irq.id for irq in irqs_nobalance]
+    ids = sorted(irq.id for irq in irqs_nobalance)  # Stable file contents
     logg.warning(
         f'irq_restart() - Reconfiguring irqbalance; blacklisting CPUs {cpus_nobalance.get_str()} - protecting irqs {ids}.'
     )
 
     cpus_no_balancing_mask = tl.list_to_mask(cpus_nobalance.cpu_list)
-    strmask = f'{cpus_no_balancing_mask:x}'
-    strmask_commad = ''
-    while len(strmask) > 0:
-        strmask_commad = strmask[-8:] + ',' + strmask_commad
-        strmask = strmask[:-8]
-    strmask_commad = strmask_commad[:-1]
+    strmask_commad = tl.int_to_maskstr(cpus_no_balancing_mask)
 
     with open('/etc/default/irqbalance', 'r') as f:
-        lines = f.readlines()
+        contents = f.read()
 
     autogen_warn = '# WARNING - THIS FILE WRITTEN BY SCRIPT / swmain.infra.rtconf.macros'
-    full_line_BANNED_CPUS = f'IRQBALANCE_BANNED_CPUS="{strmask_commad}"' + \
-        autogen_warn + '\n'
-    list_banirq = [f'--banirq={str(irq.id)}' for irq in irqs_nobalance]
-    full_line_ARGS = f'IRQBALANCE_ARGS="{" ".join(list_banirq)}"' + \
-        autogen_warn + '\n'
-
-    for ll in range(len(lines)):
-        if 'IRQBALANCE_BANNED_CPUS=' in lines[ll]:
-            lines[ll] = full_line_BANNED_CPUS
-        if 'IRQBALANCE_ARGS=' in lines[ll]:
-            lines[ll] = full_line_ARGS
+    list_banirq = [f'--banirq={irq_id}' for irq_id in ids]
+    new_lines = {
+        'IRQBALANCE_BANNED_CPUS':
+        f'IRQBALANCE_BANNED_CPUS="{strmask_commad}"' + autogen_warn,
+        'IRQBALANCE_ARGS':
+        f'IRQBALANCE_ARGS="{" ".join(list_banirq)}"' + autogen_warn,
+    }
+    contents = _IRQBALANCE_KEYS_RE.sub(lambda m: new_lines[m.group(1)],
+                                       contents)
 
     # I'm a moron -- it's /etc/default/irqbalance on ubuntu
     # /etc/sysconfig/irqbalance on RHEL/SUSE
-    with open('/etc/default/irqbalance', 'w') as f:
-        f.writelines(lines)
-    with open('/etc/sysconfig/irqbalance', 'w') as f:
-        f.writelines(lines)
-
-    sproc.run(['systemctl', 'start', 'irqbalance'])
+    changed = False
+    for path in ('/etc/default/irqbalance', '/etc/sysconfig/irqbalance'):
+        try:
+            with open(path, 'r') as f:
+                if f.read() == contents:
+                    continue
+        except FileNotFoundError:
+            pass
+        changed = True
+        tmp_path = path + '.rtconf.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(contents)
+        os.replace(tmp_path, path)
+
+    # Config untouched and irqbalance still up (no irq_parking): nothing to do.
+    if not changed and sproc.run(
+        ['systemctl', 'is-active', '--quiet', 'irqbalance']).returncode == 0:
+        logg.info('irq_restart() - irqbalance config unchanged and running.')
+        return
+
+    # restart, not start: a running irqbalance must pick up the new config.
+    sproc.run(['systemctl', 'restart', 'irqbalance'])
 
 
 @tl.root_decorator
@@ -202,7 +375,6 @@ def cset_destruction():
     '''
         Destroy all currently existing cpusets
     '''
-    from .functions import rescan_cpusets
     logg.warning(f'cset_destruction() - destroying all current csets.')
 
     cpuset_dict = rescan_cpusets()
@@ -212,23 +384,20 @@ def cset_destruction():
 
 
 @tl.root_decorator
-def cset_creation(csets: list[CPUSpec], shield_cpus: CPUSpec) -> None:
+def cset_creation(csets: typ.Sequence[CPUSpec], shield_cpus: CPUSpec) -> None:
 
     logg.warning(
         f'cset_creation() - Initializing {len(csets)} - shielded CPUs: {shield_cpus.get_str()}.'
     )
 
     # There's a glitch on AMD, so first let's make a "cset shield"
-    sproc.run(
-        f'cset shield -c {tl.list_to_range_notation(shield_cpus.cpu_list)}'.
-        split(' '))
+    sproc.run(['cset', 'shield', '-c', shield_cpus.get_str()])
     # then destroy the shielded set - but some other tweaks happened (?)
     sproc.run('cset set -d user'.split(' '))
     # Also enable all memory banks for /system
     # ASSUME shield-cpus has all memories enabled
     assert shield_cpus.mem_list is not None
-    mem_range = tl.list_to_range_notation(shield_cpus.mem_list)
-    sproc.run(f'cset set -m {mem_range} system'.split(' '))
+    sproc.run(['cset', 'set', '-m', shield_cpus.get_mem_str(), 'system'])
 
     # Now create the custom csets.
     for cset in csets:
@@ -250,15 +419,12 @@ def irq_summary(irqs: list[IRQ]) -> None:
 
 
 def kthread_summary(kts: list[KThread]) -> None:
-    from .kthread import KThreadTypeEnum as KTTE
     for kt in kts:
         if not kt.was_cset_successfully_once:
             # Some are valid to not be moved.
-            ok_nomove = (kt.kthread_type in [
-                KTTE.RCUC, KTTE.CPUHP, KTTE.KSOFTIRQD, KTTE.IDLE_INJECT,
-                KTTE.MIGRATION, KTTE.IDLE_INJECT, KTTE.IRQ_WORK
-            ] or (kt.kthread_type == KTTE.KWORKER
-                  and 'mm_percpu_wq' in kt._comm)
+            ok_nomove = (kt.kthread_type in _OK_NOMOVE_KTYPES
+                         or (kt.kthread_type == KTTE.KWORKER
+                             and 'mm_percpu_wq' in kt._comm)
                          or (kt.kthread_type == KTTE.KWORKER
                              and 'events_highpri' in kt._comm))
             if not ok_nomove:
@@ -53,7 +53,7 @@ class EDTObject:  # Could really subclass IRQ - but we'd need to promote class o
 
         cpu = cset.cpu_list[0]
 
-        if not cpu in tl.NUMA_CPULIST[self.irq.best_node]:
+        if cpu not in tl.NUMA_CPULIST[self.irq.best_node]:
             msg = 'EDTObj: use of favorite NUMA node required.'
             logg.critical(msg)
             raise RuntimeError(msg)
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import typing as typ
 
+import json
+import functools
 import subprocess as sproc
 from dataclasses import dataclass
 
@@ -13,6 +15,26 @@ import logging
 logg = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def iface_ipv4_addr(iface: str) -> str:
+    '''
+    First IPv4 address of a network interface, '' if none.
+    '''
+    try:
+        p = sproc.run(['ip', '-j', 'addr', 'show', iface], stdout=sproc.PIPE)
+    except FileNotFoundError:
+        logg.error('iface_ipv4_addr: ip (iproute2) not installed.')
+        return ''
+    if p.returncode != 0 or not p.stdout:
+        return ''
+
+    for link in json.loads(p.stdout):
+        for addr in link.get('addr_info', []):
+            if addr.get('family') == 'inet':
+                return addr['local']
+    return ''
+
+
 @dataclass
 class PCIDevice:
     pci_addr: str
@@ -43,11 +65,7 @@ class PCIDevice:
     def add_network_iface(self, iface: str) -> None:
         self.net_iface = iface
         # Hopefully only one IP...
-        self.ip_addr = sproc.run(
-            f'ip addr show {self.net_iface}' +
-            ' | grep "\<inet\>" | awk \'{ print $2 }\' | awk -F "/" \'{ print $1 }\'',
-            shell=True,
-            stdout=sproc.PIPE).stdout.decode().strip()
+        self.ip_addr = iface_ipv4_addr(self.net_iface)
 
         logg.info(
             f'PCIDevice::add_network_iface() - {self.pci_addr}, {self.net_iface} IP {self.ip_addr}'
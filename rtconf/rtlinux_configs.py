@@ -5,7 +5,10 @@ if typ.TYPE_CHECKING:
     from .irqs import IRQ
 
 import os
+import re
+import pwd
 import glob
+import functools
 import logging
 
 logg = logging.getLogger(__name__)
@@ -17,6 +20,13 @@ from . import tools as tl
 from .kthread import KThread, KThreadTypeEnum
 from . import functions
 
+# Plain CPU or CPU range isolcpus= tokens - flags like 'domain' or 'nohz' are skipped.
+_ISOLCPUS_RE = re.compile(r'^\d+(?:-\d+)?$')
+
+# RCU housekeeping kthreads, moved to a dedicated cpuset by the special rules
+_RCU_HOUSEKEEP_KTYPES = frozenset(
+    {KThreadTypeEnum.RCUB, KThreadTypeEnum.RCUOG, KThreadTypeEnum.RCUOP})
+
 
 class BaseConfig(ABC):
 
@@ -38,19 +48,34 @@ class BaseConfig(ABC):
 
     DMA_LATENCY = False
 
-    my_cpusets: list[CPUSpec] = []
+    my_cpusets: tuple[CPUSpec, ...] = ()
+    # Derived from my_cpusets at class creation - see __init_subclass__
+    my_cpusets_dict: dict[str, CPUSpec] = {}
+    my_nobalance_cpus: frozenset[int] = frozenset()
     cpus_no_balancing: CPUSpec | None = None
     irqs_nobalancing: set[IRQ] = set()
 
+    def __init_subclass__(cls, **kwargs: typ.Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.my_cpusets = tuple(cls.my_cpusets)
+        cls.my_cpusets_dict = {cset.name: cset for cset in cls.my_cpusets}
+        nobalance_sets = (cset.cpu_set for cset in cls.my_cpusets
+                          if cset.no_irqbalance)
+        cls.my_nobalance_cpus = frozenset().union(*nobalance_sets)
+
     def __init__(self) -> None:
         # Enforce the singleton - by failure, not by returning the singleton instance.
-        logg.info(f'Calling BaseConfig __init__ from subclass {type(self)}')
-        _subdir_members = self.__dir__()
-        _subdir_members = {
-            v: getattr(self, v)
-            for v in self.__dir__() if not v.startswith('__')
-        }
-        logg.info(f'Class variable configuration: {_subdir_members}')
+        logg.info('Calling BaseConfig __init__ from subclass %s', type(self))
+        if logg.isEnabledFor(logging.INFO):
+            # Class-level settings only, walking the MRO so subclass overrides win.
+            # Reading class __dict__s never triggers property getters.
+            class_members = {
+                k: v
+                for cls in reversed(type(self).__mro__)
+                for k, v in vars(cls).items() if not k.startswith('_')
+                and not callable(v) and not isinstance(v, property)
+            }
+            logg.info('Class variable configuration: %s', class_members)
 
         if BaseConfig.singleton_instantiated:
             logg.critical('Double-init on supposedly singleton class.')
@@ -64,17 +89,14 @@ class BaseConfig(ABC):
         self.all_cpus = CPUSpec('root',
                                 cpu_list=list(tl.ALL_CPUS),
                                 mem_list=list(range(tl.MEMORY_COUNT)))
-        cmdline = tl.procfs_read('/proc/cmdline')[0].split(' ')
+        cmdline = tl.procfs_read_first_line('/proc/cmdline').split(' ')
         s_isolcpus = ''
-        import re
-        for c in cmdline:
-            if c.startswith('isolcpus='):
-                isol_specs = c.split('=')[1].split(',')
-                s_isolcpus = ','.join([
-                    s for s in isol_specs
-                    if re.search('^[0-9]+(\-[0-9]+)?$', s)
-                ])
-                break
+        isolcpus_arg = next((c for c in cmdline if c.startswith('isolcpus=')),
+                            None)
+        if isolcpus_arg is not None:
+            isol_specs = isolcpus_arg.split('=')[1].split(',')
+            s_isolcpus = ','.join(s for s in isol_specs
+                                  if _ISOLCPUS_RE.match(s))
 
         # Togo logg a warning if we didn't find anything.
 
@@ -85,20 +107,14 @@ class BaseConfig(ABC):
         # System CPUs must be the non-isolated ones.
         self.all_system_cpus = CPUSpec(
             name='system',
-            cpu_list=list(
-                set(self.all_cpus.cpu_list) -
-                set(self.all_reserved_cpus.cpu_list)),
+            cpu_list=list(self.all_cpus.cpu_set -
+                          self.all_reserved_cpus.cpu_set),
             mem_list=self.all_cpus.mem_list)
 
-        cpus_no_balancing = set(self.all_reserved_cpus.cpu_list)
-        for cset in self.my_cpusets:
-            if cset.no_irqbalance:
-                cpus_no_balancing.update(cset.cpu_list)
-
-        self.cpus_no_balancing = CPUSpec('nobalance',
-                                         cpu_list=list(cpus_no_balancing))
-
-        self.my_cpusets_dict = {cset.name: cset for cset in self.my_cpusets}
+        self.cpus_no_balancing = CPUSpec(
+            'nobalance',
+            cpu_list=list(self.all_reserved_cpus.cpu_set
+                          | self.my_nobalance_cpus))
 
     def irq_kthread_special_rules(self, irq_list: list[IRQ],
                                   kt_list: list[KThread]) -> None:
@@ -126,7 +142,7 @@ class SC5Config(RTCConfig):
     # TODO: where do we park Hiperf NVME? Basic DiskIO?
 
     # yapf: disable
-    my_cpusets = [
+    my_cpusets = (
         # 0-5 SYSTEM
 
         # o for OCAM (EDT numa 0)
@@ -181,7 +197,7 @@ class SC5Config(RTCConfig):
 
         # RTmon
         CPUSpec('RTmon', cpu_list=[35], mem_list=[1], no_irqbalance=True),
-    ]
+    )
     # yapf: enable
 
     def irq_kthread_special_rules(self, irq_list: list[IRQ],
@@ -189,7 +205,9 @@ class SC5Config(RTCConfig):
 
         logg.info('irq_kthread_special_rules @ SC5Config')
 
-        edt_objs = functions.identify_fg_objs(irq_list, driver='edt')
+        by_driver = functions.irqs_by_driver(irq_list)
+
+        edt_objs = functions.make_fg_objs(by_driver['edt'])
         assert len(edt_objs) == 5
         self.irqs_nobalancing.update({e.irq for e in edt_objs})
         # Bind
@@ -199,17 +217,15 @@ class SC5Config(RTCConfig):
         edt_objs[3].bind_to_cset(self.my_cpusets_dict['p_edt'], ktprio=49)
         edt_objs[4].bind_to_cset(self.my_cpusets_dict['g_work'], ktprio=49)
 
-        asl_objs = functions.identify_fg_objs(irq_list, driver='aslenum')
+        asl_objs = functions.make_fg_objs(by_driver['aslenum'])
         assert len(asl_objs) == 2
         self.irqs_nobalancing.update({e.irq for e in asl_objs})
         asl_objs[0].bind_to_cset(self.my_cpusets_dict['v2_asl'])
         asl_objs[1].bind_to_cset(self.my_cpusets_dict['v1_asl'])
 
-        for irq in irq_list:
-            if irq.pci_device and irq.pci_device.driver == 'mlx5_core':
-                irq.set_pin_to_cpu(
-                    self.my_cpusets_dict['irq_mlx_safe'].cpu_list)
-                self.irqs_nobalancing.add(irq)
+        for irq in by_driver['mlx5_core']:
+            irq.set_pin_to_cpu(self.my_cpusets_dict['irq_mlx_safe'].cpu_list)
+            self.irqs_nobalancing.add(irq)
 
         for kt in kt_list:
             if 'mlx5' in kt.name:
@@ -219,10 +235,7 @@ class SC5Config(RTCConfig):
             elif kt.kthread_type == KThreadTypeEnum.RCUC:
                 kt.chrt_ff(30)
 
-            elif kt.kthread_type in [
-                    KThreadTypeEnum.RCUB, KThreadTypeEnum.RCUOG,
-                    KThreadTypeEnum.RCUOP
-            ]:
+            elif kt.kthread_type in _RCU_HOUSEKEEP_KTYPES:
                 kt.pin_cset(self.my_cpusets_dict['kt_rcu_safe'])
                 kt.chrt_ff(30)
 
@@ -248,7 +261,7 @@ class AORTSConfig(RTCConfig):
 
     # WARNING: CPUS ARE INTERLEAVED
     # yapf: disable
-    my_cpusets = [
+    my_cpusets = (
         # EVEN CPUS (NUMA 0) (0-38:2)
         # 0,2,4,6,8,10 SYSTEM (6 numa 0, 6 numa 1)
 
@@ -308,7 +321,7 @@ class AORTSConfig(RTCConfig):
 
         # 39 RTmon
         CPUSpec('RTmon', cpu_list=[39], mem_list=[1], no_irqbalance=True),
-    ]
+    )
     # yapf: enable
 
     def irq_kthread_special_rules(self, irq_list: list[IRQ],
@@ -318,18 +331,19 @@ class AORTSConfig(RTCConfig):
         for irq in irq_list:
             irq.was_pinned_successfully_once = False
 
-        edt_objs = functions.identify_fg_objs(irq_list, driver='edt')
+        by_driver = functions.irqs_by_driver(irq_list)
+
+        edt_objs = functions.make_fg_objs(by_driver['edt'])
         assert len(edt_objs) == 1
         self.irqs_nobalancing.update({e.irq for e in edt_objs})
         edt_objs[0].bind_to_cset(self.my_cpusets_dict['i_edt'], ktprio=49)
 
-        fpdp_objs = functions.identify_fg_objs(irq_list,
-                                               driver='dcfi_nsl_module')
+        fpdp_objs = functions.make_fg_objs(by_driver['dcfi_nsl_module'])
         assert len(fpdp_objs) == 1
         self.irqs_nobalancing.update({e.irq for e in fpdp_objs})
         fpdp_objs[0].bind_to_cset(self.my_cpusets_dict['fpdp_recv'], ktprio=49)
 
-        asl_objs = functions.identify_fg_objs(irq_list, driver='aslenum')
+        asl_objs = functions.make_fg_objs(by_driver['aslenum'])
         assert len(asl_objs) == 1
         self.irqs_nobalancing.update({e.irq for e in asl_objs})
         asl_objs[0].bind_to_cset(
@@ -355,10 +369,7 @@ class AORTSConfig(RTCConfig):
             elif kt.kthread_type == KThreadTypeEnum.RCUC:
                 kt.chrt_ff(30)
 
-            elif kt.kthread_type in [
-                    KThreadTypeEnum.RCUB, KThreadTypeEnum.RCUOG,
-                    KThreadTypeEnum.RCUOP
-            ]:
+            elif kt.kthread_type in _RCU_HOUSEKEEP_KTYPES:
                 kt.pin_cset(self.my_cpusets_dict['kt_rcu'])
                 kt.chrt_ff(30)
 
@@ -366,25 +377,32 @@ class AORTSConfig(RTCConfig):
         # FIXME need to handle and figure out the FPDP kthreads and interrupts, if any??
 
 
+@functools.lru_cache(maxsize=1)
+def _lookup_whichcomp() -> str:
+    # This is a server ID, provided by the shell environment
+    WHICHCOMP = os.environ.get('WHICHCOMP', '')
+    if WHICHCOMP != '' or os.getuid() != 0:
+        return WHICHCOMP
+
+    # We want to be able to get this even from a root session.
+    # Last resort: ask the login shell of the main user.
+    import subprocess as sproc
+    try:
+        main_user = pwd.getpwuid(1000).pw_name
+    except KeyError:
+        return ''
+    # Same argv the old 'sudo -Hiu user echo \$WHICHCOMP' shell line produced:
+    # sudo -i hands it to the user's login shell, which expands it.
+    lines = sproc.run(['sudo', '-Hiu', main_user, 'echo', '$WHICHCOMP'],
+                      stdout=sproc.PIPE).stdout.decode().split('\n')
+    return lines[-2].rstrip() if len(lines) >= 2 else ''
+
+
 def find_right_config() -> BaseConfig:
 
     logg.info('find_right_config()')
 
-    # We want to be able to get this even from a root session.
-    WHICHCOMP: str = ''
-    if os.getuid() != 0:
-        WHICHCOMP = os.environ.get(
-            'WHICHCOMP',
-            '')  # This is a server ID, provided by the shell environment
-    else:  # root
-        import subprocess as sproc
-        main_user = sproc.run(f'getent passwd 1000 | cut -d : -f 1',
-                              shell=True,
-                              stdout=sproc.PIPE).stdout.decode().rstrip()
-        WHICHCOMP = sproc.run(
-            f'sudo -Hiu {main_user} echo \$WHICHCOMP',
-            shell=True,
-            stdout=sproc.PIPE).stdout.decode().split('\n')[-2].rstrip()
+    WHICHCOMP = _lookup_whichcomp()
 
     if WHICHCOMP == '':
         logg.critical(
@@ -26,7 +26,9 @@ if __name__ == '__main__':
     ONLY_INIT = args['--init']
     FORK_CHECK_DO_NOTHING = args['--forkcheck']
 
-    from rtconf import rtlinux_configs, functions, macros
+    from rtconf import rtlinux_configs, functions, macros, tools
+    tools.raise_nofile_limit()
+
     cfg = rtlinux_configs.find_right_config()
 
     # =========================
@@ -40,8 +42,6 @@ if __name__ == '__main__':
     functions.match_irq_and_pci(irqs, devs)
     functions.match_kthread_and_irq(irqs, kthreads)
 
-    # cpupower retcode is 2 if compiled for wrong kernel.
-    functions.check_command('cpupower', 1)
     functions.check_command('cset')
 
     # We need to FORK to run some stuff as root.
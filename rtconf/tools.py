@@ -1,9 +1,18 @@
 import os
+import re
+import errno
 import subprocess as sproc
+import threading
+import functools
+import itertools
+import operator
+import resource
+
+from concurrent.futures import ThreadPoolExecutor
 
 from enum import IntEnum
 
-from typing import List, Callable, Tuple, Set, Any, Union, Iterable, TypeVar
+from typing import TYPE_CHECKING, Collection, Dict, List, Sequence, Callable, Tuple, FrozenSet, Any, Union, Iterable, TypeVar, Optional
 from typing_extensions import ParamSpec  # Will be in typing in 3.10
 
 import logging
@@ -18,11 +27,20 @@ class ProcfsWriteError(Exception):
 P = ParamSpec("P")
 R = TypeVar("R")
 
+# The uid doesn't change under us: checked once rather than on every decorated call.
+_UID_IS_ROOT = os.getuid() == 0
+
+
+def _refresh_uid() -> None:
+    # For the odd caller that does setuid mid-process.
+    global _UID_IS_ROOT
+    _UID_IS_ROOT = os.getuid() == 0
+
 
 def root_decorator(func: Callable[P, R]) -> Callable[P, R]:
 
     def decorated_func(*args: P.args, **kwargs: P.kwargs) -> R:
-        if os.getuid() != 0:
+        if not _UID_IS_ROOT:
             raise PermissionError('Must be root.')
         return func(*args, **kwargs)
 
@@ -32,116 +50,276 @@ def root_decorator(func: Callable[P, R]) -> Callable[P, R]:
 def no_root_decorator(func: Callable[P, R]) -> Callable[P, R]:
 
     def decorated_func(*args: P.args, **kwargs: P.kwargs) -> R:
-        if os.getuid() == 0:
+        if _UID_IS_ROOT:
             raise PermissionError('Must not be root.')
         return func(*args, **kwargs)
 
     return decorated_func
 
 
-def range_to_list(range_str: str) -> List[int]:
+# One 'N' or 'N-M' token of a cpulist
+_RANGE_TOKEN_RE = re.compile(r'(\d+)(?:-(\d+))?')
+
+
+@functools.lru_cache(maxsize=1024)
+def _range_to_tuple(range_str: str) -> Tuple[int, ...]:
 
     if len(range_str) == 0:
-        return []
+        return ()
 
-    int_list = []
+    int_list: List[int] = []
     for token in range_str.split(','):
-        if '-' in token:
-            l, h = [int(t) for t in token.split('-')]
-            assert l <= h
+        m = _RANGE_TOKEN_RE.fullmatch(token.strip())
+        if m is None:
+            raise ValueError(
+                f'Invalid CPU range token {token!r} in {range_str!r}')
+        l = int(m.group(1))
+        h = l if m.group(2) is None else int(m.group(2))
+        assert l <= h
 
-            int_list += list(range(l, h + 1))
-        else:
-            int_list += [int(token)]
+        int_list.extend(range(l, h + 1))
 
-    return int_list
+    return tuple(int_list)
 
 
-def list_to_range_notation(cpu_list: List[int]) -> str:
+def range_to_list(range_str: str) -> List[int]:
+    # Same few CPU range strings over and over: parse once, copy out.
+    return list(_range_to_tuple(range_str))
 
-    # Assume the list is sorted... or redo it.
-    cpu_list.sort()
 
-    pending: List[int] = []
+# list_to_range_notation: above this many CPUs, find the runs with numpy.
+_RANGE_NOTATION_NUMPY_MIN = 256
 
-    s = ''
 
-    # Adding [-1] in iterator avoid having to finalize the last range
-    # after the loop
-    for c in cpu_list + [-1]:
-        if len(pending) == 0:
-            pending = [c]
-            continue
+def _list_to_range_notation_np(cpu_list: Sequence[int]) -> str:
+    # Imported here: tools stays importable (and cheap) without numpy.
+    import numpy as np
+
+    arr = np.asarray(cpu_list, dtype=np.int64)  # Sorted by the caller.
+    breaks = np.flatnonzero(np.diff(arr) != 1)
+    starts = arr[np.concatenate(([0], breaks + 1))].tolist()
+    ends = arr[np.concatenate((breaks, [len(arr) - 1]))].tolist()
+
+    return ','.join(
+        str(s) if s == e else f'{s}-{e}' for s, e in zip(starts, ends))
+
+
+def list_to_range_notation(cpu_list: Iterable[int]) -> str:
+    # Sorts a copy - the caller's list is left alone.
+    return sorted_list_to_range_notation(sorted(cpu_list))
 
-        if c == pending[-1] + 1:
-            pending.append(c)
-            continue
 
-        if len(pending) == 1:
-            s += f',{pending[0]}'
-        else:  # >= 2
-            s += f',{pending[0]}-{pending[-1]}'
-        pending = [c]
+def sorted_list_to_range_notation(cpu_list: Sequence[int]) -> str:
+    '''
+    list_to_range_notation for an already ascending cpu_list: no sort, no copy.
+    '''
+    if not cpu_list:
+        return ''
 
-    # To confirm
-    assert pending == [-1]
+    if len(cpu_list) > _RANGE_NOTATION_NUMPY_MIN:
+        return _list_to_range_notation_np(cpu_list)
 
-    # Pop the initial comma
-    return s[1:]
+    parts: List[str] = []
+
+    # Current run is [start, prev]. Appending -1 to the iteration flushes
+    # the last run without a copy of the list.
+    start = prev = cpu_list[0]
+    for c in itertools.chain(itertools.islice(cpu_list, 1, None), (-1, )):
+        if c == prev + 1:
+            prev = c
+            continue
+
+        if start == prev:
+            parts.append(str(start))
+        else:
+            parts.append(f'{start}-{prev}')
+        start = prev = c
+
+    return ','.join(parts)
 
 
 def maskstr_to_int(maskstr: str) -> int:
-    # Solve the issue of comma-separated hexlists when more than 8-chars.
-    return int(maskstr.replace(',', ''), 16)
+    # Solve the issue of comma-separated hexlists when more than 8-chars:
+    # shift-combine the groups rather than building a comma-less copy.
+    mask = 0
+    for chunk in maskstr.strip().split(','):
+        mask = (mask << (4 * len(chunk))) | int(chunk, 16)
+    return mask
 
 
-def mask_to_list(mask: int) -> List[int]:
+def int_to_maskstr(mask: int) -> str:
+    # Reverse of maskstr_to_int: comma every 8 hex chars, from the right.
+    hexmask = f'{mask:x}'
+    first = len(hexmask) % 8 or 8
+    return ','.join([hexmask[:first]] +
+                    [hexmask[i:i + 8] for i in range(first, len(hexmask), 8)])
+
+
+# Set bit offsets of every byte value, to walk masks a byte at a time.
+_BYTE_BITS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(i for i in range(8) if (b >> i) & 1) for b in range(256))
+
+# 1 << cpu for every CPU we can see.
+_CPU_BIT: Tuple[int, ...] = tuple(
+    1 << i for i in range(os.cpu_count() or 1))  # type: ignore
+
+
+@functools.lru_cache(maxsize=1024)
+def _mask_to_tuple(mask: int) -> Tuple[int, ...]:
     assert mask >= 0
 
-    int_list = []
-    cc = 0
-    while mask > 0:
-        if mask & 0x1:
-            int_list.append(cc)
-        cc += 1
-        mask >>= 1
+    cpus: List[int] = []
+    for base, byte in enumerate(
+            mask.to_bytes((mask.bit_length() + 7) // 8, 'little')):
+        if byte:
+            cpus.extend(8 * base + off for off in _BYTE_BITS[byte])
+    return tuple(cpus)
+
 
-    return int_list
+def mask_to_list(mask: int) -> List[int]:
+    return list(_mask_to_tuple(mask))
 
 
 def list_to_mask(cpu_list: Iterable[int]) -> int:
-    mask = 0x0
-    for cc in cpu_list:
-        mask |= 1 << cc
-
-    return mask
+    # OR is idempotent: duplicates are harmless, no dedup set needed.
+    if not isinstance(cpu_list, Collection):
+        cpu_list = list(cpu_list)  # Several passes below.
+    if min(cpu_list, default=0) < 0:  # Would index _CPU_BIT from the end.
+        raise ValueError(f'Negative CPU id in {cpu_list}')
+    try:
+        return functools.reduce(operator.or_,
+                                map(_CPU_BIT.__getitem__, cpu_list), 0)
+    except IndexError:  # Offline CPU id beyond the table
+        return functools.reduce(operator.or_, (1 << cc for cc in cpu_list), 0)
 
 
 @root_decorator
-def procfs_write(file: str, content: str) -> None:
-    with open(file, 'w') as f:
-        ret = f.write(content)
-    if ret <= 0:
+def procfs_write(file: str,
+                 content: Union[str, bytes],
+                 dir_fd: Optional[int] = None) -> None:
+    '''
+    Single raw os.write to a procfs / sysfs file.
+    dir_fd: optional directory fd that file is relative to (openat).
+    '''
+    data = content.encode() if isinstance(content, str) else content
+    fd = os.open(file, os.O_WRONLY, dir_fd=dir_fd)
+    try:
+        ret = os.write(fd, data)
+    finally:
+        os.close(fd)
+    # procfs / sysfs take a value in one write
+    if ret <= 0 or ret != len(data):
         raise ProcfsWriteError(
-            f'Error writing to procfs file: {file} - value {content}')
+            f'Error writing to procfs file: {file} - value {content!r}')
+
+
+# procfs_write_list: above this many files, spread the writes over a thread pool.
+_WRITE_LIST_PARALLEL_MIN = 32
+_WRITE_LIST_MAX_WORKERS = 8
 
 
 @root_decorator
 def procfs_write_list(config: List[Tuple[str, Union[str, int]]]) -> None:
+    '''
+    Long lists are written concurrently - the kernel serializes per file, not across files.
+    '''
+    # Repeated writes to the same file collapse into the last one, in last-write order.
+    pending: Dict[str, bytes] = {}
     for file, value in config:
-        procfs_write(file, str(value))
+        pending.pop(file, None)
+        pending[file] = str(value).encode()
+
+    if len(pending) <= _WRITE_LIST_PARALLEL_MIN:
+        for file, data in pending.items():
+            procfs_write(file, data)
+        return
+
+    with ThreadPoolExecutor(max_workers=_WRITE_LIST_MAX_WORKERS) as pool:
+        list(pool.map(procfs_write, pending.keys(), pending.values()))
 
 
-def procfs_read(file: str) -> List[str]:
-    with open(file, 'r') as f:
-        content = f.readlines()
+# Per-thread scratch buffer for the procfs_read_* helpers
+_read_tls = threading.local()
+
+
+def _read_buf() -> bytearray:
+    buf: Optional[bytearray] = getattr(_read_tls, 'buf', None)
+    if buf is None:
+        buf = _read_tls.buf = bytearray(8192)
+    return buf
+
+
+def procfs_read_bytes(file: str, dir_fd: Optional[int] = None) -> bytes:
+    '''
+    Read a whole procfs / sysfs file with raw os.read calls into a
+    reusable buffer - no python file object, no line buffering.
+    dir_fd: optional directory fd that file is relative to (openat).
+    '''
+    buf = _read_buf()
+    chunks: List[bytes] = []
+    fd = os.open(file, os.O_RDONLY, dir_fd=dir_fd)
+    try:
+        while (n := os.readv(fd, [buf])) > 0:
+            chunks.append(bytes(buf[:n]))
+    finally:
+        os.close(fd)
+
+    return b''.join(chunks)
+
+
+def procfs_read_first_line(file: str, dir_fd: Optional[int] = None) -> str:
+    '''
+    First line of a procfs / sysfs file, right-stripped ('' if empty).
+    Stops reading at the first newline - no list of lines built.
+    '''
+    buf = _read_buf()
+    chunks: List[bytes] = []
+    fd = os.open(file, os.O_RDONLY, dir_fd=dir_fd)
+    try:
+        while (n := os.readv(fd, [buf])) > 0:
+            eol = buf.find(b'\n', 0, n)
+            if eol >= 0:
+                chunks.append(bytes(buf[:eol]))
+                break
+            chunks.append(bytes(buf[:n]))
+    finally:
+        os.close(fd)
+
+    return b''.join(chunks).decode().rstrip()
+
+
+def procfs_read(file: str, dir_fd: Optional[int] = None) -> List[str]:
+    content = procfs_read_bytes(file, dir_fd).decode().splitlines()
     return [c.rstrip() for c in content]
 
 
 @root_decorator
 def sysctl_write_list(config: List[Tuple[str, Union[str, int]]]) -> None:
+    # Writing /proc/sys directly beats any sysctl exec. Group the keys by
+    # directory (net.core, net.ipv4...): one directory fd per group, and each
+    # key opened by its bare name relative to it.
+    by_dir: Dict[str, List[Tuple[str, str, str]]] = {}
     for sysctl_key, value in config:
-        sysctl_write(sysctl_key, str(value))
+        parent, _, leaf = sysctl_key.rpartition('.')
+        by_dir.setdefault(parent, []).append((sysctl_key, leaf, str(value)))
+
+    for parent, entries in by_dir.items():
+        try:
+            dir_fd = os.open('/proc/sys/' + parent.replace('.', '/'),
+                             os.O_RDONLY | os.O_DIRECTORY)
+        except FileNotFoundError:
+            for sysctl_key, _, contents in entries:
+                _sysctl_missing(sysctl_key, contents)
+            continue
+
+        try:
+            for sysctl_key, leaf, contents in entries:
+                try:
+                    procfs_write(leaf, contents, dir_fd=dir_fd)
+                except FileNotFoundError:
+                    _sysctl_missing(sysctl_key, contents)
+        finally:
+            os.close(dir_fd)
 
 
 @root_decorator
@@ -150,93 +328,112 @@ def sysctl_write(sysctl_key: str, contents: str) -> None:
     try:
         procfs_write(sysctl_file, contents)
     except FileNotFoundError:
-        logg.error(
-            f'sysctl_write: key {sysctl_key} (for value {contents}) does not exist'
-        )
+        _sysctl_missing(sysctl_key, contents)
+
+
+def _sysctl_missing(sysctl_key: str, contents: str) -> None:
+    logg.error(
+        f'sysctl_write: key {sysctl_key} (for value {contents}) does not exist'
+    )
 
 
 def sysctl_read(sysctl_key: str) -> str:
     sysctl_file = '/proc/sys/' + sysctl_key.replace('.', '/')
     read = ''
     try:
-        read = procfs_read(sysctl_file)[0]
+        read = procfs_read_first_line(sysctl_file)
     except FileNotFoundError:
         logg.error(f'sysctl_read: key {sysctl_key} does not exist')
 
     return read
 
 
-def parse_numa_info() -> Tuple[int, List[Set[int]]]:
+# The parse_* probes below don't change while we run: cached, and returning
+# immutable containers since every caller shares the result.
+# Use e.g. parse_lsmod.cache_clear() after an insmod / rmmod.
 
-    p = sproc.run('lscpu | grep NUMA', shell=True, stdout=sproc.PIPE)
-    res = p.stdout.decode().split('\n')[:-1]
 
-    nodes = int(res[0].split(':')[1])
-    sets_per_node = []
-    for nn in range(nodes):
-        cpu_range = res[nn + 1].split(':')[1].strip()
-        sets_per_node += [set(range_to_list(cpu_range))]
+def _online_cpus() -> FrozenSet[int]:
+    # Online CPUs - not necessarily 0..N-1 once hyperthreading_disable
+    # has dropped sibling CPUs (interleaved on some machines).
+    try:
+        return frozenset(
+            range_to_list(
+                procfs_read_first_line('/sys/devices/system/cpu/online')))
+    except FileNotFoundError:
+        return frozenset(range(os.cpu_count()))  # type: ignore
 
-    return nodes, sets_per_node
 
+@functools.lru_cache(maxsize=None)
+def parse_numa_info() -> Tuple[int, Tuple[FrozenSet[int], ...]]:
+    # Same nodes as lscpu reports (online ones), straight from sysfs.
+    node_sysfs = '/sys/devices/system/node'
+    try:
+        node_ids = range_to_list(
+            procfs_read_first_line(f'{node_sysfs}/online'))
+    except FileNotFoundError:  # Kernel without CONFIG_NUMA: one node.
+        return 1, (_online_cpus(), )
 
-def parse_lsmod() -> List[str]:
-    p = sproc.run('lsmod', shell=True, stdout=sproc.PIPE)
-    res = p.stdout.decode().split('\n')[:-1]
-    modules = [l.split()[0]
-               for l in res[1:]]  # Remove title line, first column.
+    sets_per_node = tuple(
+        frozenset(
+            range_to_list(
+                procfs_read_first_line(f'{node_sysfs}/node{nn}/cpulist')))
+        for nn in node_ids)
 
-    return modules
+    return len(node_ids), sets_per_node
 
 
-def parse_lspci_for_edt_boards(format_colons: bool = False) -> List[str]:
-    p = sproc.run(
-        'lspci | grep "Engineering Design Team, Inc." | awk \'{print $1}\'',
-        shell=True,
-        stdout=sproc.PIPE)
+@functools.lru_cache(maxsize=None)
+def parse_lsmod() -> Tuple[str, ...]:
+    # lsmod is just a formatted /proc/modules: no title line there, first column.
+    try:
+        res = procfs_read_bytes('/proc/modules').splitlines()
+    except FileNotFoundError:  # Kernel built without module support.
+        return ()
+    modules = tuple(l.split(None, 1)[0].decode() for l in res)
 
-    # Contains adresses in 'XX:XX.X' format
-    res = p.stdout.decode().split('\n')[:-1]
+    return modules
 
-    if format_colons:
-        # 0000:XX:YY.Z
-        return ['0000:' + r for r in res]
-    else:
-        # XXYY
-        return [r.split('.')[0].replace(':', '') for r in res]
 
+@functools.lru_cache(maxsize=1)
+def _lspci_lines() -> Tuple[str, ...]:
+    # One lspci run shared by all the parse_lspci_for_* lookups.
+    try:
+        p = sproc.run(['lspci'], stdout=sproc.PIPE)
+    except FileNotFoundError:
+        logg.error('lspci not installed.')
+        return ()
+    return tuple(p.stdout.decode().splitlines())
 
-def parse_lspci_for_fpdp_boards(format_colons: bool = False) -> List[str]:
-    p = sproc.run(
-        'lspci | grep "Systran Corp Device 464d" | awk \'{print $1}\'',
-        shell=True,
-        stdout=sproc.PIPE)
 
+def _parse_lspci_for(pattern: str, format_colons: bool) -> Tuple[str, ...]:
+    # Same as lspci | grep pattern | awk '{print $1}'
     # Contains adresses in 'XX:XX.X' format
-    res = p.stdout.decode().split('\n')[:-1]
+    res = [l.split(None, 1)[0] for l in _lspci_lines() if pattern in l]
 
     if format_colons:
         # 0000:XX:YY.Z
-        return ['0000:' + r for r in res]
+        return tuple('0000:' + r for r in res)
     else:
         # XXYY
-        return [r.split('.')[0].replace(':', '') for r in res]
+        return tuple(r.split('.')[0].replace(':', '') for r in res)
 
 
-def parse_lspci_for_pci_switches(format_colons: bool = False) -> List[str]:
-    p = sproc.run('lspci | grep "PCI bridge:" | awk \'{print $1}\'',
-                  shell=True,
-                  stdout=sproc.PIPE)
+@functools.lru_cache(maxsize=None)
+def parse_lspci_for_edt_boards(format_colons: bool = False) -> Tuple[str, ...]:
+    return _parse_lspci_for('Engineering Design Team, Inc.', format_colons)
 
-    # Contains adresses in 'XX:XX.X' format
-    res = p.stdout.decode().split('\n')[:-1]
 
-    if format_colons:
-        # 0000:XX:YY.Z
-        return ['0000:' + r for r in res]
-    else:
-        # XXYY
-        return [r.split('.')[0].replace(':', '') for r in res]
+@functools.lru_cache(maxsize=None)
+def parse_lspci_for_fpdp_boards(
+        format_colons: bool = False) -> Tuple[str, ...]:
+    return _parse_lspci_for('Systran Corp Device 464d', format_colons)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_lspci_for_pci_switches(
+        format_colons: bool = False) -> Tuple[str, ...]:
+    return _parse_lspci_for('PCI bridge:', format_colons)
 
 
 @root_decorator
@@ -257,14 +454,104 @@ def cset_proc_call(cmd_args: str) -> None:
     cpusetproc.func(parser, options, args)
 
 
-# Some system constants to get on import.
-CPU_COUNT: int = os.cpu_count()  # type: ignore
-ALL_CPUS = set(range(CPU_COUNT))
-NUMA_COUNT, NUMA_CPULIST = parse_numa_info()
-MEMORY_COUNT: int = NUMA_COUNT
+def raise_nofile_limit() -> None:
+    '''
+    Lift the soft open-fd limit to the hard limit.
+    KThreads keep a pidfd and polled IRQs keep their procfs files open, within
+    a budget derived from that limit: more fds held, fewer fallbacks.
+    Process-wide and inherited by children: call from entry points only.
+    '''
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        logg.warning('raise_nofile_limit: could not raise RLIMIT_NOFILE.')
+
+
+# Long-lived fds held by rtconf objects (KThread pidfds, polled IRQ procfs files),
+# counted process-wide and kept well under RLIMIT_NOFILE: scans and one-off reads
+# always have room left.
+_HELD_FDS_HEADROOM = 128
+_held_fds = 0
+_held_fds_lock = threading.Lock()
+
+
+def _held_fds_budget() -> int:
+    soft = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    if soft == resource.RLIM_INFINITY:
+        soft = 1 << 20
+    return max(soft - _HELD_FDS_HEADROOM, 0) // 2
+
+
+def open_held_fd(opener: Callable[[], int]) -> Optional[int]:
+    '''
+    Open a long-lived fd through opener, within the process-wide budget.
+    None when over budget or out of fds - callers fall back to short-lived opens.
+    Other OSErrors propagate. Release with close_held_fd.
+    '''
+    global _held_fds
+    with _held_fds_lock:
+        if _held_fds >= _held_fds_budget():
+            return None
+        _held_fds += 1
 
-logg.warning(f'CPU count: {CPU_COUNT}')
-logg.warning(f'All CPUs: {ALL_CPUS}')
-logg.warning(f'NUMA count: {NUMA_COUNT}')
-for ii in range(NUMA_COUNT):
-    logg.warning(f'NUMA domain {ii}: CPUs {NUMA_CPULIST[ii]}')
+    try:
+        return opener()
+    except OSError as exc:
+        with _held_fds_lock:
+            _held_fds -= 1
+        if exc.errno in (errno.EMFILE, errno.ENFILE):
+            return None
+        raise
+
+
+def close_held_fd(fd: int) -> None:
+    global _held_fds
+    os.close(fd)
+    with _held_fds_lock:
+        _held_fds -= 1
+
+
+# Machine topology - computed on first access through the module __getattr__ below,
+# so that importing tools for its helpers stays cheap.
+if TYPE_CHECKING:
+    CPU_COUNT: int
+    ALL_CPUS: FrozenSet[int]
+    NUMA_COUNT: int
+    NUMA_CPULIST: Tuple[FrozenSet[int], ...]
+    MEMORY_COUNT: int
+
+_TOPOLOGY_NAMES = frozenset(
+    {'CPU_COUNT', 'ALL_CPUS', 'NUMA_COUNT', 'NUMA_CPULIST', 'MEMORY_COUNT'})
+_topology_lock = threading.Lock()
+
+
+def _load_topology() -> None:
+    with _topology_lock:
+        if 'CPU_COUNT' in globals():  # Another thread beat us to it.
+            return
+
+        all_cpus = _online_cpus()
+        cpu_count = len(all_cpus)
+        numa_count, numa_cpulist = parse_numa_info()
+
+        logg.warning(f'CPU count: {cpu_count}')
+        logg.warning(f'All CPUs: {set(all_cpus)}')
+        logg.warning(f'NUMA count: {numa_count}')
+        for ii in range(numa_count):
+            logg.warning(f'NUMA domain {ii}: CPUs {set(numa_cpulist[ii])}')
+
+        # Plain module globals from now on: __getattr__ is not hit again.
+        globals().update(ALL_CPUS=all_cpus,
+                         NUMA_COUNT=numa_count,
+                         NUMA_CPULIST=numa_cpulist,
+                         MEMORY_COUNT=numa_count)
+        globals()['CPU_COUNT'] = cpu_count  # Last: marks the load complete.
+
+
+def __getattr__(name: str) -> Any:
+    if name in _TOPOLOGY_NAMES:
+        _load_topology()
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')